@@ -22,6 +22,54 @@ class Config:
     # Data paths
     DATA_PATH = 'data/sample'
     
+    # Warehouse statistics: estimate (pg_class), tracked (counters) or exact (COUNT(*))
+    STATS_MODE = os.getenv('STATS_MODE', 'estimate')
+    
+    # Post-load checks cover only the new batch; run a full audit every N batches (0 = never)
+    FULL_AUDIT_EVERY = int(os.getenv('FULL_AUDIT_EVERY', '0'))
+    
+    # Usage events more than this many minutes apart start a new session
+    SESSION_GAP_MINUTES = int(os.getenv('SESSION_GAP_MINUTES', '30'))
+    
+    # Users whose stored events are re-sessionized at a time when rollups are rebuilt
+    ROLLUP_REBUILD_CHUNK_USERS = int(os.getenv('ROLLUP_REBUILD_CHUNK_USERS', '10000'))
+    
+    # Processes for the user-sharded transform (1 = serial)
+    TRANSFORM_WORKERS = int(os.getenv('TRANSFORM_WORKERS', '1'))
+    
+    # Surrogate key lookups: switch from ANY(%s) to a temp-table join at this many ids
+    KEY_LOOKUP_TEMP_TABLE_MIN = int(os.getenv('KEY_LOOKUP_TEMP_TABLE_MIN', '10000'))
+    KEY_LOOKUP_CHUNK_SIZE = 50_000
+    
+    # Bulk load (drop + rebuild fact indexes) when a batch is this large vs the table
+    BULK_LOAD_RATIO = float(os.getenv('BULK_LOAD_RATIO', '0.2'))
+    BULK_LOAD_MIN_ROWS = int(os.getenv('BULK_LOAD_MIN_ROWS', '100000'))
+    
+    # ANALYZE fact_subscriptions after any load adding at least this fraction of rows
+    ANALYZE_RATIO = float(os.getenv('ANALYZE_RATIO', '0.1'))
+    
+    # Watch mode (python main.py --watch): poll interval, settle time, max batch delay
+    WATCH_POLL_SECONDS = float(os.getenv('WATCH_POLL_SECONDS', '1.0'))
+    WATCH_DEBOUNCE_SECONDS = float(os.getenv('WATCH_DEBOUNCE_SECONDS', '2.0'))
+    WATCH_MAX_LATENCY_SECONDS = float(os.getenv('WATCH_MAX_LATENCY_SECONDS', '30.0'))
+    
+    # Post-load metric snapshots for dashboards (empty EXPORT_PATH = don't export)
+    EXPORT_PATH = os.getenv('EXPORT_PATH', 'exports')
+    EXPORT_FETCH_ROWS = int(os.getenv('EXPORT_FETCH_ROWS', '10000'))
+    EXPORT_COMPRESSION = os.getenv('EXPORT_COMPRESSION', 'zstd')
+    
+    # Cross-run dedupe: Bloom filter files of loaded ids (empty DEDUPE_PATH = off)
+    DEDUPE_PATH = os.getenv('DEDUPE_PATH', '.seen_ids')
+    DEDUPE_CAPACITY = int(os.getenv('DEDUPE_CAPACITY', '10000000'))
+    DEDUPE_FP_RATE = float(os.getenv('DEDUPE_FP_RATE', '0.01'))
+    
+    # Validation: hard checks see every row; soft checks on larger inputs are sampled
+    # to fit the time budget, with confidence bounds on the violation rates
+    VALIDATION_TIME_BUDGET_SECONDS = float(os.getenv('VALIDATION_TIME_BUDGET_SECONDS', '30'))
+    VALIDATION_SAMPLE_ABOVE_ROWS = int(os.getenv('VALIDATION_SAMPLE_ABOVE_ROWS', '1000000'))
+    VALIDATION_CONFIDENCE = float(os.getenv('VALIDATION_CONFIDENCE', '0.95'))
+    VALIDATION_MIN_SAMPLE_ROWS = int(os.getenv('VALIDATION_MIN_SAMPLE_ROWS', '10000'))
+    
     @property
     def db_connection_string(self):
         """Get PostgreSQL connection string"""
@@ -1,19 +1,36 @@
 """
 Main ETL Pipeline Orchestrator
 Run: python main.py
+     python main.py --phase extract --handoff-dir /shared/run1
 """
 
+import argparse
+from pathlib import Path
 from src.extract import DataExtractor
 from src.transform import DataTransformer
 from src.load import DataLoader
 from src.database import DatabaseHelper
+from src.pricing import PlanPriceIndex
+from src.handoff import PhaseHandoff
+from src.watcher import MicroBatchDaemon
+from src.dedupe import SeenIds
+from config import config
 from datetime import datetime
 
 
-def run_etl_pipeline():
-    """Execute full ETL pipeline"""
+PHASES = ['extract', 'transform', 'load']
+
+
+def run_etl_pipeline(phase='all', handoff_dir=None):
+    """Execute the full ETL pipeline, or a single phase via hand-off files"""
     
     start_time = datetime.now()
+    phases = PHASES if phase == 'all' else [phase]
+    
+    # Each phase writes DIR/<phase>/ and reads the previous phase's output
+    handoffs = {}
+    if handoff_dir:
+        handoffs = {name: PhaseHandoff(Path(handoff_dir) / name) for name in PHASES}
     
     print("\n" + "="*60)
     print("🚀 SaaS ETL PIPELINE")
@@ -21,23 +38,48 @@ def run_etl_pipeline():
     print(f"Started at: {start_time.strftime('%Y-%m-%d %H:%M:%S')}\n")
     
     try:
+        if phase != 'all' and not handoff_dir:
+            raise ValueError(f"--phase {phase} needs --handoff-dir for its hand-off files")
+        
         # Step 1: Extract
-        print("STEP 1: EXTRACT DATA")
-        print("-" * 60)
-        extractor = DataExtractor()
-        raw_data = extractor.extract_all()
+        if 'extract' in phases:
+            print("STEP 1: EXTRACT DATA")
+            print("-" * 60)
+            extractor = DataExtractor()
+            raw_data = extractor.extract_all()
+            
+            if handoffs:
+                handoffs['extract'].write(raw_data)
+        else:
+            raw_data = None
         
         # Step 2: Transform
-        print("\nSTEP 2: TRANSFORM DATA")
-        print("-" * 60)
-        transformer = DataTransformer()
-        clean_data = transformer.transform_all(raw_data)
+        if 'transform' in phases:
+            print("\nSTEP 2: TRANSFORM DATA")
+            print("-" * 60)
+            if raw_data is None:
+                raw_data = handoffs['extract'].read()
+            
+            transformer = DataTransformer(
+                price_index=PlanPriceIndex.from_database(),
+                seen_ids=SeenIds() if config.DEDUPE_PATH else None
+            )
+            clean_data = transformer.transform_all(raw_data)
+            
+            if handoffs:
+                handoffs['transform'].write(clean_data)
+        else:
+            clean_data = None
         
         # Step 3: Load
-        print("\nSTEP 3: LOAD TO WAREHOUSE")
-        print("-" * 60)
-        loader = DataLoader()
-        loader.load_all(clean_data)
+        if 'load' in phases:
+            print("\nSTEP 3: LOAD TO WAREHOUSE")
+            print("-" * 60)
+            if clean_data is None:
+                clean_data = handoffs['transform'].read()
+            
+            loader = DataLoader()
+            loader.load_all(clean_data)
         
         # Success!
         end_time = datetime.now()
@@ -50,7 +92,7 @@ def run_etl_pipeline():
         print(f"Finished at: {end_time.strftime('%Y-%m-%d %H:%M:%S')}")
         
         return True
-        
+    
     except Exception as e:
         print("\n" + "="*60)
         print("❌ ETL PIPELINE FAILED")
@@ -59,8 +101,42 @@ def run_etl_pipeline():
         return False
 
 
+def run_watch_mode(watch_dir):
+    """Run micro-batches for new/changed files until interrupted"""
+    daemon = MicroBatchDaemon(
+        watch_dir,
+        transformer=DataTransformer(
+            price_index=PlanPriceIndex.from_database(),
+            seen_ids=SeenIds() if config.DEDUPE_PATH else None
+        ),
+        loader=DataLoader(),
+        poll_seconds=config.WATCH_POLL_SECONDS,
+        debounce_seconds=config.WATCH_DEBOUNCE_SECONDS,
+        max_latency_seconds=config.WATCH_MAX_LATENCY_SECONDS
+    )
+    daemon.run()
+
+
+def parse_args():
+    """Command line options"""
+    parser = argparse.ArgumentParser(description="SaaS ETL pipeline")
+    parser.add_argument('--phase', choices=['all'] + PHASES, default='all',
+                        help="run one phase only (default: all)")
+    parser.add_argument('--handoff-dir',
+                        help="directory for Arrow hand-off files between phases")
+    parser.add_argument('--watch', nargs='?', const=config.DATA_PATH, metavar='DIR',
+                        help="keep running and load new/changed files in DIR as micro-batches")
+    return parser.parse_args()
+
+
 if __name__ == '__main__':
-    success = run_etl_pipeline()
+    args = parse_args()
+    
+    if args.watch:
+        run_watch_mode(args.watch)
+        raise SystemExit(0)
+    
+    success = run_etl_pipeline(phase=args.phase, handoff_dir=args.handoff_dir)
     
     if success:
         print("\n💡 Next steps:")
@@ -72,28 +148,3 @@ if __name__ == '__main__':
         print("   1. Check database connection in .env")
         print("   2. Verify tables exist: psql -d saas_db -f sql/schema.sql")
         print("   3. Check logs for errors")
-```
-
----
-
-#### File: `.env.example` (Updated with comments)
-```
-# ================================================
-# Database Configuration
-# Copy this file to .env and update with your info
-# ================================================
-
-DB_HOST=localhost
-DB_PORT=5432
-DB_NAME=saas_db
-DB_USER=postgres
-DB_PASSWORD=your_password
-
-# ================================================
-# Setup Instructions:
-# 1. Create database: createdb saas_db
-# 2. Run schema: psql -d saas_db -f sql/schema.sql
-# 3. Copy this file: cp .env.example .env
-# 4. Update DB_PASSWORD with your actual password
-# 5. Run pipeline: python main.py
-# ================================================
\ No newline at end of file
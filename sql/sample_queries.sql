@@ -15,6 +15,17 @@ SELECT
 FROM fact_subscriptions
 WHERE event_type != 'cancel';
 
+-- Current MRR and plan mix (from the maintained per-user state table)
+SELECT 
+    p.plan_name,
+    COUNT(*) FILTER (WHERE s.current_mrr > 0) as paying_users,
+    SUM(s.current_mrr) as current_mrr
+FROM subscription_state s
+JOIN dim_plans p ON s.plan_key = p.plan_key
+WHERE s.last_event_type != 'cancel'
+GROUP BY p.plan_name
+ORDER BY current_mrr DESC;
+
 -- Plan Distribution
 SELECT 
     p.plan_name,
@@ -5,9 +5,15 @@
 
 -- Clean slate
 DROP TABLE IF EXISTS fact_subscriptions CASCADE;
+DROP TABLE IF EXISTS subscription_state CASCADE;
+DROP TABLE IF EXISTS agg_daily_user_usage CASCADE;
+DROP TABLE IF EXISTS agg_daily_feature_usage CASCADE;
 DROP TABLE IF EXISTS dim_users CASCADE;
 DROP TABLE IF EXISTS dim_plans CASCADE;
 DROP TABLE IF EXISTS dim_dates CASCADE;
+DROP TABLE IF EXISTS etl_table_counts CASCADE;
+DROP TABLE IF EXISTS etl_batches CASCADE;
+DROP TABLE IF EXISTS etl_seen_events CASCADE;
 
 -- =====================================================
 -- DIMENSION: Users
@@ -19,18 +25,23 @@ CREATE TABLE dim_users (
     email VARCHAR(255),
     signup_date DATE,
     company_size VARCHAR(20),
-    industry VARCHAR(50)
+    industry VARCHAR(50),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 -- =====================================================
 -- DIMENSION: Plans
 -- =====================================================
 
+-- One row per price version: a price change is a new row with a later
+-- effective_from, so historical events keep the price they were billed at
 CREATE TABLE dim_plans (
     plan_key SERIAL PRIMARY KEY,
-    plan_id VARCHAR(20) UNIQUE,
+    plan_id VARCHAR(20) NOT NULL,
     plan_name VARCHAR(50),
-    monthly_price DECIMAL(10,2)
+    monthly_price DECIMAL(10,2),
+    effective_from DATE NOT NULL DEFAULT '1970-01-01',
+    UNIQUE (plan_id, effective_from)
 );
 
 -- Insert standard plans
@@ -39,6 +50,10 @@ INSERT INTO dim_plans (plan_id, plan_name, monthly_price) VALUES
 ('pro', 'Pro', 29.00),
 ('enterprise', 'Enterprise', 99.00);
 
+-- Example price change:
+-- INSERT INTO dim_plans (plan_id, plan_name, monthly_price, effective_from)
+-- VALUES ('pro', 'Pro', 35.00, '2025-01-01');
+
 -- =====================================================
 -- DIMENSION: Dates
 -- =====================================================
@@ -63,33 +78,129 @@ SELECT
     TO_CHAR(d, 'Day')
 FROM generate_series('2023-01-01'::DATE, '2026-12-31'::DATE, '1 day') d;
 
+-- =====================================================
+-- ETL: Load batches
+-- Every load run gets a batch_id; fact rows are tagged with it
+-- =====================================================
+
+CREATE TABLE etl_batches (
+    batch_id SERIAL PRIMARY KEY,
+    status VARCHAR(20),  -- running, loaded, loaded_with_issues, failed
+    rows_loaded INTEGER DEFAULT 0,
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
 -- =====================================================
 -- FACT: Subscriptions
 -- =====================================================
 
 CREATE TABLE fact_subscriptions (
     sub_key SERIAL PRIMARY KEY,
+    subscription_id VARCHAR(50),  -- source id, used to drop re-sent events
     user_key INTEGER REFERENCES dim_users(user_key),
     plan_key INTEGER REFERENCES dim_plans(plan_key),
     date_key INTEGER REFERENCES dim_dates(date_key),
     
     event_type VARCHAR(20),  -- signup, upgrade, downgrade, cancel
-    mrr_amount DECIMAL(10,2)
+    mrr_amount DECIMAL(10,2),
+    batch_id INTEGER  -- etl_batches.batch_id of the load that inserted it
 );
 
 -- Indexes for common queries
 CREATE INDEX idx_fact_user ON fact_subscriptions(user_key);
 CREATE INDEX idx_fact_date ON fact_subscriptions(date_key);
 CREATE INDEX idx_fact_event ON fact_subscriptions(event_type);
+CREATE INDEX idx_fact_batch ON fact_subscriptions(batch_id);
+CREATE UNIQUE INDEX idx_fact_subscription_id ON fact_subscriptions(subscription_id);  -- re-sent events are skipped
 
 -- =====================================================
--- Quick verification
+-- STATE: Current subscription per user
+-- Maintained incrementally by the loader for users in each batch
+-- (late events replay only that user's affected history)
+-- =====================================================
+
+CREATE TABLE subscription_state (
+    user_key INTEGER PRIMARY KEY REFERENCES dim_users(user_key),
+    plan_key INTEGER REFERENCES dim_plans(plan_key),
+    last_event_type VARCHAR(20),
+    current_mrr DECIMAL(10,2),  -- 0 once cancelled
+    last_date_key INTEGER,
+    last_event_date DATE,
+    last_sub_key INTEGER,       -- tie-break for events on the same day
+    event_count INTEGER,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- =====================================================
+-- AGGREGATES: Daily usage rollups
+-- Built from sessionized usage events (events.json, kept in etl_seen_events)
+-- =====================================================
+
+CREATE TABLE agg_daily_user_usage (
+    user_key INTEGER REFERENCES dim_users(user_key),
+    date_key INTEGER REFERENCES dim_dates(date_key),
+    events INTEGER,
+    sessions INTEGER,         -- sessions that started on this day
+    session_seconds INTEGER,  -- first-to-last event time of those sessions
+    features_used INTEGER,    -- distinct features used
+    PRIMARY KEY (user_key, date_key)
+);
+
+CREATE TABLE agg_daily_feature_usage (
+    date_key INTEGER REFERENCES dim_dates(date_key),
+    feature_name VARCHAR(50),
+    events INTEGER,
+    users INTEGER,            -- distinct users
+    PRIMARY KEY (date_key, feature_name)
+);
+
 -- =====================================================
+-- ETL: Loaded usage events
+-- Rollups of a day that gains events are re-aggregated from every
+-- event stored for it (re-sent windows may only partly overlap);
+-- the ids also confirm repeats flagged by the transform's seen-set
+-- =====================================================
+
+CREATE TABLE etl_seen_events (
+    event_id VARCHAR(50) PRIMARY KEY,
+    user_key INTEGER REFERENCES dim_users(user_key),
+    event_type VARCHAR(50),
+    feature_name VARCHAR(50),
+    event_time TIMESTAMP,
+    batch_id INTEGER
+);
+
+-- Rollup rebuilds read one user's or one feature's events per day
+CREATE INDEX idx_seen_events_user_time ON etl_seen_events(user_key, event_time);
+CREATE INDEX idx_seen_events_feature_time ON etl_seen_events(feature_name, event_time);
 
-SELECT 'dim_users' as table_name, COUNT(*) FROM dim_users
+-- =====================================================
+-- ETL: Running row counts
+-- Maintained by the loader so statistics never need COUNT(*)
+-- =====================================================
+
+CREATE TABLE etl_table_counts (
+    table_name VARCHAR(63) PRIMARY KEY,
+    row_count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO etl_table_counts (table_name, row_count)
+SELECT 'dim_users', COUNT(*) FROM dim_users
 UNION ALL
 SELECT 'dim_plans', COUNT(*) FROM dim_plans
 UNION ALL
 SELECT 'dim_dates', COUNT(*) FROM dim_dates
 UNION ALL
-SELECT 'fact_subscriptions', COUNT(*) FROM fact_subscriptions;
\ No newline at end of file
+SELECT 'fact_subscriptions', COUNT(*) FROM fact_subscriptions;
+
+-- Give the planner (and catalog estimates) real numbers from the start
+ANALYZE dim_plans;
+ANALYZE dim_dates;
+
+-- =====================================================
+-- Quick verification
+-- =====================================================
+
+SELECT table_name, row_count FROM etl_table_counts ORDER BY table_name;
\ No newline at end of file
@@ -2,8 +2,10 @@
 Database utilities and helper functions
 """
 
+import shutil
 import psycopg2
 from config import config
+from src.stats import WarehouseStats
 
 
 class DatabaseHelper:
@@ -44,11 +46,24 @@ class DatabaseHelper:
             cursor = conn.cursor()
             
             # Clear in order (facts first, then dimensions)
+            cursor.execute("DELETE FROM subscription_state;")
             cursor.execute("DELETE FROM fact_subscriptions;")
+            cursor.execute("DELETE FROM agg_daily_user_usage;")
+            cursor.execute("DELETE FROM agg_daily_feature_usage;")
+            cursor.execute("DELETE FROM etl_seen_events;")
             cursor.execute("DELETE FROM dim_users;")
             
+            # Reset running counts to match
+            stats = WarehouseStats(cursor)
+            stats.set_count('fact_subscriptions', 0)
+            stats.set_count('dim_users', 0)
+            
             conn.commit()
             
+            # Seen-id filters would only point at rows that are gone
+            if config.DEDUPE_PATH:
+                shutil.rmtree(config.DEDUPE_PATH, ignore_errors=True)
+            
             print("✅ All data cleared")
             
             cursor.close()
@@ -59,18 +74,14 @@ class DatabaseHelper:
             raise
     
     @staticmethod
-    def get_table_counts():
-        """Get row counts from all tables"""
+    def get_table_counts(mode=None):
+        """Get row counts from all tables (estimate, tracked or exact)"""
         try:
             conn = psycopg2.connect(config.db_connection_string)
             cursor = conn.cursor()
             
-            tables = ['dim_users', 'dim_plans', 'dim_dates', 'fact_subscriptions']
-            counts = {}
-            
-            for table in tables:
-                cursor.execute(f"SELECT COUNT(*) FROM {table}")
-                counts[table] = cursor.fetchone()[0]
+            counts = WarehouseStats(cursor).get_counts(mode or config.STATS_MODE)
+            conn.commit()
             
             cursor.close()
             conn.close()
@@ -90,4 +101,4 @@ if __name__ == '__main__':
     counts = DatabaseHelper.get_table_counts()
     if counts:
         for table, count in counts.items():
-            print(f"   {table}: {count:,}")
\ No newline at end of file
+            print(f"   {table}: {count:,}" if count is not None else f"   {table}: unknown")
\ No newline at end of file
@@ -0,0 +1,217 @@
+"""
+Dedupe module - remembers subscription and event ids across runs
+Memory-mapped Bloom filters screen each batch; only probable hits hit the database
+"""
+
+import math
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import psycopg2
+from config import config
+
+
+# Where each kind of id is stored in the warehouse (see sql/schema.sql)
+ID_TABLES = {
+    'subscriptions': ('fact_subscriptions', 'subscription_id'),
+    'events': ('etl_seen_events', 'event_id')
+}
+
+# 16-byte SipHash key for id hashing (changing it invalidates existing filters)
+HASH_KEY = 'saas-etl-bloom01'
+
+
+def _mix64(h):
+    """splitmix64 finalizer: a second, independent-looking hash from the first"""
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+
+class BloomFilter:
+    """Fixed-size bit array in a memory-mapped file"""
+    
+    # Header: magic, bit count, hash count, ids added (4 x uint64)
+    MAGIC = 0x424C4F4F4D303031
+    HEADER_BYTES = 32
+    
+    # Ids hashed per step, bounding the (ids x hashes) position arrays
+    CHUNK_SIZE = 1_000_000
+    
+    def __init__(self, path, capacity, fp_rate):
+        self.path = Path(path)
+        self.created = not self.path.exists()
+        
+        if not self.created:
+            header = np.fromfile(self.path, dtype=np.uint64, count=4)
+            if len(header) < 4 or header[0] != self.MAGIC:
+                raise ValueError(f"{self.path} is not a Bloom filter file")
+            self.num_bits, self.num_hashes = int(header[1]), int(header[2])
+        else:
+            # Optimal size for `capacity` ids at the target false positive rate
+            self.num_bits = int(math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+            self.num_bits += -self.num_bits % 8
+            self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+            
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            header = np.memmap(self.path, dtype=np.uint64, mode='w+',
+                               shape=(self.HEADER_BYTES // 8 + self.num_bits // 64 + 1,))
+            header[:3] = [self.MAGIC, self.num_bits, self.num_hashes]
+            header.flush()
+            del header
+        
+        self.capacity = capacity
+        self.header = np.memmap(self.path, dtype=np.uint64, mode='r+', shape=(4,))
+        self.bits = np.memmap(self.path, dtype=np.uint8, mode='r+',
+                              offset=self.HEADER_BYTES, shape=(self.num_bits // 8,))
+    
+    @property
+    def count(self):
+        """Ids added so far (re-adds included)"""
+        return int(self.header[3])
+    
+    def positions(self, ids):
+        """Bit positions of each id, shape (len(ids), num_hashes)"""
+        # categorize=False: ids are mostly unique, factorizing first only costs time
+        h1 = pd.util.hash_array(np.asarray(ids, dtype=object), hash_key=HASH_KEY, categorize=False)
+        h2 = _mix64(h1) | np.uint64(1)
+        
+        # Double hashing: h1 + i * h2 (wrapping uint64 arithmetic) for i in 0..k-1
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        return (h1[:, None] + steps[None, :] * h2[:, None]) % np.uint64(self.num_bits)
+    
+    def might_contain(self, ids):
+        """True where an id was probably added before, False where it never was"""
+        result = np.zeros(len(ids), dtype=bool)
+        
+        for start in range(0, len(ids), self.CHUNK_SIZE):
+            pos = self.positions(ids[start:start + self.CHUNK_SIZE])
+            masks = np.left_shift(np.uint64(1), pos & np.uint64(7)).astype(np.uint8)
+            result[start:start + len(pos)] = ((self.bits[pos >> np.uint64(3)] & masks) != 0).all(axis=1)
+        
+        return result
+    
+    def add(self, ids):
+        """Set the bits of every id"""
+        for start in range(0, len(ids), self.CHUNK_SIZE):
+            pos = self.positions(ids[start:start + self.CHUNK_SIZE]).ravel()
+            masks = np.left_shift(np.uint64(1), pos & np.uint64(7)).astype(np.uint8)
+            np.bitwise_or.at(self.bits, (pos >> np.uint64(3)).astype(np.intp), masks)
+        
+        self.header[3] += np.uint64(len(ids))
+    
+    def flush(self):
+        """Write dirty pages back to the file"""
+        self.bits.flush()
+        self.header.flush()
+
+
+class SeenIds:
+    """Cross-run seen-sets for subscription and event ids"""
+    
+    def __init__(self, path=None, capacity=None, fp_rate=None, verify=None, seed=None):
+        self.path = Path(path or config.DEDUPE_PATH)
+        self.capacity = capacity or config.DEDUPE_CAPACITY
+        self.fp_rate = fp_rate or config.DEDUPE_FP_RATE
+        
+        # verify(kind, ids) -> ids really present; seed(kind) -> chunks of stored ids.
+        # Both default to the warehouse.
+        self.verify = verify or self.find_in_database
+        self.seed = seed or self.stream_from_database
+        self.filters = {}
+    
+    def filter(self, kind):
+        """Open the Bloom filter file for one kind of id, building it if missing"""
+        if kind not in self.filters:
+            path = self.path / f"{kind}.bloom"
+            
+            if path.exists():
+                bloom = BloomFilter(path, self.capacity, self.fp_rate)
+            else:
+                # A new filter must know every id already loaded, or repeats slip through
+                print(f"   🌱 Building {kind} seen-set from the warehouse...")
+                tmp_path = path.with_name(path.name + '.tmp')
+                tmp_path.unlink(missing_ok=True)
+                
+                bloom = BloomFilter(tmp_path, self.capacity, self.fp_rate)
+                for ids in self.seed(kind):
+                    bloom.add(ids)
+                bloom.flush()
+                
+                # Only a fully seeded filter gets the real name
+                tmp_path.replace(path)
+                bloom.path = path
+            
+            self.filters[kind] = bloom
+        return self.filters[kind]
+    
+    def stream_from_database(self, kind):
+        """Yield chunks of all ids stored in the warehouse"""
+        table, column = ID_TABLES[kind]
+        chunk_size = config.KEY_LOOKUP_CHUNK_SIZE
+        
+        conn = psycopg2.connect(config.db_connection_string)
+        try:
+            # Server-side cursor: one chunk of ids in memory at a time
+            with conn.cursor(name=f"seed_{kind}") as cursor:
+                cursor.itersize = chunk_size
+                cursor.execute(f"SELECT {column} FROM {table} WHERE {column} IS NOT NULL")
+                
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield np.array([row[0] for row in rows], dtype=object)
+        finally:
+            conn.close()
+    
+    def find_in_database(self, kind, ids):
+        """Return the subset of ids already stored in the warehouse"""
+        table, column = ID_TABLES[kind]
+        query = f"SELECT {column} FROM {table} WHERE {column} = ANY(%s)"
+        
+        conn = psycopg2.connect(config.db_connection_string)
+        cursor = conn.cursor()
+        
+        found = set()
+        try:
+            chunk_size = config.KEY_LOOKUP_CHUNK_SIZE
+            for start in range(0, len(ids), chunk_size):
+                cursor.execute(query, (list(ids[start:start + chunk_size]),))
+                found.update(row[0] for row in cursor.fetchall())
+        finally:
+            cursor.close()
+            conn.close()
+        
+        return found
+    
+    def seen_mask(self, kind, ids):
+        """Boolean Series: True where the id was loaded by an earlier run"""
+        ids = pd.Series(ids)
+        seen = pd.Series(False, index=ids.index)
+        
+        valid = ids.notna()
+        probable = pd.Series(False, index=ids.index)
+        probable[valid] = self.filter(kind).might_contain(ids[valid].to_numpy())
+        
+        # Bloom filters never miss, so only probable hits need checking
+        candidates = ids[probable].unique()
+        if len(candidates) > 0:
+            confirmed = self.verify(kind, candidates)
+            seen[probable] = ids[probable].isin(confirmed).to_numpy()
+            print(f"   🔎 {kind}: {len(candidates)} probable repeats, "
+                  f"{len(confirmed)} confirmed in warehouse")
+        
+        return seen.astype(bool)
+    
+    def remember(self, kind, ids):
+        """Add ids handed to the loader (a failed load only costs a re-check)"""
+        bloom = self.filter(kind)
+        ids = pd.Series(ids).dropna()
+        
+        bloom.add(ids.to_numpy())
+        bloom.flush()
+        
+        if bloom.count > bloom.capacity:
+            print(f"   ⚠️  {kind} seen-set holds {bloom.count:,} ids (capacity {bloom.capacity:,}); "
+                  f"false positives will rise - raise DEDUPE_CAPACITY and delete {bloom.path} to rebuild it")
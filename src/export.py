@@ -0,0 +1,221 @@
+"""
+Export module - writes metric query results as Parquet snapshots
+Dashboards read the static files instead of querying the warehouse
+"""
+
+import json
+import shutil
+from datetime import datetime
+from itertools import groupby
+from pathlib import Path
+import psycopg2
+import psycopg2.extensions
+import pyarrow as pa
+import pyarrow.parquet as pq
+from config import config
+
+
+# NUMERIC -> float so chunks convert straight to Arrow float64 columns
+NUMERIC_AS_FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values,
+    'NUMERIC_AS_FLOAT',
+    lambda value, cursor: float(value) if value is not None else None
+)
+
+# Dashboard metrics (from sample_queries.sql, written against schema.sql).
+# Every query returns a `month` column first and is ordered by it, so results
+# can be streamed into one partition at a time.
+METRIC_QUERIES = {
+    'mrr_by_month': """
+        SELECT
+            DATE_TRUNC('month', d.date)::DATE as month,
+            SUM(CASE WHEN f.event_type = 'signup' THEN f.mrr_amount ELSE 0 END) as new_mrr,
+            SUM(CASE WHEN f.event_type = 'upgrade' THEN f.mrr_amount ELSE 0 END) as expansion_mrr,
+            SUM(CASE WHEN f.event_type = 'downgrade' THEN -f.mrr_amount ELSE 0 END) as contraction_mrr,
+            SUM(CASE WHEN f.event_type = 'cancel' THEN -f.mrr_amount ELSE 0 END) as churned_mrr
+        FROM fact_subscriptions f
+        JOIN dim_dates d ON f.date_key = d.date_key
+        GROUP BY 1
+        ORDER BY 1
+    """,
+    'signups_by_month': """
+        SELECT
+            DATE_TRUNC('month', d.date)::DATE as month,
+            COUNT(*) as new_signups
+        FROM fact_subscriptions f
+        JOIN dim_dates d ON f.date_key = d.date_key
+        WHERE f.event_type = 'signup'
+        GROUP BY 1
+        ORDER BY 1
+    """,
+    'plan_activity_by_month': """
+        SELECT
+            DATE_TRUNC('month', d.date)::DATE as month,
+            p.plan_name,
+            f.event_type,
+            COUNT(*) as events,
+            COUNT(DISTINCT f.user_key) as users,
+            SUM(f.mrr_amount) as mrr_amount
+        FROM fact_subscriptions f
+        JOIN dim_dates d ON f.date_key = d.date_key
+        JOIN dim_plans p ON f.plan_key = p.plan_key
+        GROUP BY 1, 2, 3
+        ORDER BY 1, 2, 3
+    """,
+    'industry_mrr_by_month': """
+        SELECT
+            DATE_TRUNC('month', d.date)::DATE as month,
+            u.industry,
+            u.company_size,
+            COUNT(DISTINCT u.user_key) as customers,
+            SUM(f.mrr_amount) as total_mrr
+        FROM fact_subscriptions f
+        JOIN dim_dates d ON f.date_key = d.date_key
+        JOIN dim_users u ON f.user_key = u.user_key
+        WHERE f.event_type != 'cancel'
+        GROUP BY 1, 2, 3
+        ORDER BY 1, 2, 3
+    """,
+    'signup_cohorts': """
+        SELECT
+            DATE_TRUNC('month', u.signup_date)::DATE as month,
+            COUNT(DISTINCT u.user_key) as cohort_size,
+            COUNT(DISTINCT CASE WHEN f.event_type != 'cancel' THEN f.user_key END) as still_active
+        FROM dim_users u
+        LEFT JOIN fact_subscriptions f ON u.user_key = f.user_key
+        WHERE u.signup_date IS NOT NULL
+        GROUP BY 1
+        ORDER BY 1
+    """,
+    'feature_usage_by_month': """
+        SELECT
+            DATE_TRUNC('month', d.date)::DATE as month,
+            a.feature_name,
+            SUM(a.events) as events,
+            MAX(a.users) as peak_daily_users
+        FROM agg_daily_feature_usage a
+        JOIN dim_dates d ON a.date_key = d.date_key
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+    """
+}
+
+# PostgreSQL type OIDs -> Arrow types (anything else is exported as text)
+ARROW_TYPES = {
+    16: pa.bool_(),
+    20: pa.int64(), 21: pa.int64(), 23: pa.int64(),
+    700: pa.float64(), 701: pa.float64(), 1700: pa.float64(),
+    1082: pa.date32(),
+    1114: pa.timestamp('us')
+}
+
+
+class MetricExporter:
+    """Runs METRIC_QUERIES and writes month-partitioned Parquet files"""
+    
+    MANIFEST = 'manifest.json'
+    
+    def __init__(self, conn, export_path=None, fetch_rows=None, compression=None):
+        self.conn = conn
+        self.export_path = Path(export_path or config.EXPORT_PATH)
+        self.fetch_rows = fetch_rows or config.EXPORT_FETCH_ROWS
+        self.compression = compression or config.EXPORT_COMPRESSION
+    
+    def export_metric(self, name, query, target_dir):
+        """Stream one query into target_dir/month=YYYY-MM/part-0.parquet"""
+        # Named cursor: rows stay on the server until fetched
+        cursor = self.conn.cursor(name=f"export_{name}")
+        cursor.itersize = self.fetch_rows
+        psycopg2.extensions.register_type(NUMERIC_AS_FLOAT, cursor)
+        
+        target_dir.mkdir(parents=True, exist_ok=True)
+        
+        rows_written = 0
+        months = 0
+        schema = None
+        writer = None
+        current_month = None
+        
+        try:
+            cursor.execute(query)
+            
+            # Only one month's rows are ever held: a chunk, split at month changes
+            while True:
+                rows = cursor.fetchmany(self.fetch_rows)
+                if not rows:
+                    break
+                
+                if schema is None:
+                    # Named cursors describe columns after the first fetch;
+                    # the month column lives in the directory name (Hive style)
+                    schema = pa.schema([
+                        (col.name, ARROW_TYPES.get(col.type_code, pa.string()))
+                        for col in cursor.description[1:]
+                    ])
+                
+                for month, group in groupby(rows, key=lambda row: row[0]):
+                    group = list(group)
+                    
+                    if month != current_month:
+                        if writer is not None:
+                            writer.close()
+                        
+                        current_month = month
+                        months += 1
+                        
+                        partition = target_dir / f"month={month:%Y-%m}"
+                        partition.mkdir(parents=True, exist_ok=True)
+                        writer = pq.ParquetWriter(
+                            partition / 'part-0.parquet', schema, compression=self.compression
+                        )
+                    
+                    columns = list(zip(*group))[1:]
+                    table = pa.Table.from_arrays(
+                        [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                        schema=schema
+                    )
+                    writer.write_table(table)
+                    rows_written += len(group)
+        finally:
+            if writer is not None:
+                writer.close()
+            cursor.close()
+        
+        print(f"   {name}: {rows_written:,} rows in {months} month partition(s)")
+        return rows_written
+    
+    def export_all(self, batch_id=None):
+        """Export every metric, swapping each snapshot in only once complete"""
+        print(f"\n📦 Exporting metric snapshots to {self.export_path}...")
+        self.export_path.mkdir(parents=True, exist_ok=True)
+        
+        metrics = {}
+        try:
+            for name, query in METRIC_QUERIES.items():
+                staging = self.export_path / f".{name}.tmp"
+                shutil.rmtree(staging, ignore_errors=True)
+                
+                metrics[name] = self.export_metric(name, query, staging)
+                
+                # Replace the previous snapshot directory
+                target = self.export_path / name
+                previous = self.export_path / f".{name}.old"
+                shutil.rmtree(previous, ignore_errors=True)
+                if target.exists():
+                    target.rename(previous)
+                staging.rename(target)
+                shutil.rmtree(previous, ignore_errors=True)
+        finally:
+            # End the read-only transaction
+            self.conn.rollback()
+        
+        with open(self.export_path / self.MANIFEST, 'w') as f:
+            json.dump({
+                'batch_id': batch_id,
+                'exported_at': datetime.now().isoformat(timespec='seconds'),
+                'compression': self.compression,
+                'metrics': metrics
+            }, f, indent=2)
+        
+        print("✅ Metric snapshots exported")
+        return metrics
@@ -6,6 +6,31 @@ Simple and straightforward data extraction
 import pandas as pd
 import json
 from pathlib import Path
+import pyarrow as pa
+import pyarrow.json as pa_json
+
+
+# Accepted JSON sources, e.g. events.json, events.ndjson.gz, events.jsonl.zst
+JSON_SUFFIXES = ['.json', '.ndjson', '.jsonl']
+COMPRESSION_SUFFIXES = ['', '.gz', '.zst']
+
+
+def source_kind(file_path):
+    """Which source a file feeds: users, subscriptions, events (or None)"""
+    name = Path(file_path).name
+    
+    if name.startswith('users') and name.endswith('.csv'):
+        return 'users'
+    
+    for kind in ['subscriptions', 'events']:
+        if name.startswith(kind) and any(
+            name.endswith(suffix + compression)
+            for suffix in JSON_SUFFIXES
+            for compression in COMPRESSION_SUFFIXES
+        ):
+            return kind
+    
+    return None
 
 
 class DataExtractor:
@@ -14,39 +39,81 @@ class DataExtractor:
     def __init__(self, data_path='data/sample'):
         self.data_path = Path(data_path)
     
-    def extract_users(self):
+    def extract_users(self, file_path=None):
         """Read users from CSV"""
-        file_path = self.data_path / 'users.csv'
+        file_path = file_path or self.data_path / 'users.csv'
         print(f"📖 Reading users from {file_path}")
         
         df = pd.read_csv(file_path)
         print(f"✅ Loaded {len(df)} users")
         return df
     
-    def extract_subscriptions(self):
-        """Read subscriptions from JSON"""
-        file_path = self.data_path / 'subscriptions.json'
-        print(f"📖 Reading subscriptions from {file_path}")
+    def find_json_source(self, name):
+        """Find <name>.json / .ndjson / .jsonl, optionally .gz or .zst compressed"""
+        for suffix in JSON_SUFFIXES:
+            for compression in COMPRESSION_SUFFIXES:
+                file_path = self.data_path / f"{name}{suffix}{compression}"
+                if file_path.exists():
+                    return file_path
+        
+        raise FileNotFoundError(f"No {name}.json/.ndjson/.jsonl file in {self.data_path}")
+    
+    def read_json(self, file_path):
+        """Read a JSON array or newline-delimited JSON file into a DataFrame"""
+        # pa.input_stream decompresses .gz/.zst on the fly from the extension
+        with pa.input_stream(str(file_path)) as f:
+            head = f.read(1024).lstrip()
+        
+        if not head.startswith(b'['):
+            # NDJSON: Arrow's native parser builds columns directly, no per-record dicts
+            table = pa_json.read_json(str(file_path))
+            return table.to_pandas(coerce_temporal_nanoseconds=True)
         
-        with open(file_path, 'r') as f:
+        # Single JSON array (small files): stdlib parser, still streamed from disk
+        with pa.input_stream(str(file_path)) as f:
             data = json.load(f)
         
-        df = pd.DataFrame(data)
+        return pd.DataFrame(data)
+    
+    def extract_subscriptions(self, file_path=None):
+        """Read subscriptions from JSON / NDJSON"""
+        file_path = file_path or self.find_json_source('subscriptions')
+        print(f"📖 Reading subscriptions from {file_path}")
+        
+        df = self.read_json(file_path)
         print(f"✅ Loaded {len(df)} subscription events")
         return df
     
-    def extract_events(self):
-        """Read usage events from JSON"""
-        file_path = self.data_path / 'events.json'
+    def extract_events(self, file_path=None):
+        """Read usage events from JSON / NDJSON"""
+        file_path = file_path or self.find_json_source('events')
         print(f"📖 Reading events from {file_path}")
         
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        
-        df = pd.DataFrame(data)
+        df = self.read_json(file_path)
         print(f"✅ Loaded {len(df)} events")
         return df
     
+    def extract_files(self, file_paths):
+        """Extract only the given source files (e.g. a micro-batch)"""
+        readers = {
+            'users': self.extract_users,
+            'subscriptions': self.extract_subscriptions,
+            'events': self.extract_events
+        }
+        
+        frames = {}
+        for file_path in sorted(file_paths):
+            kind = source_kind(file_path)
+            if kind is None:
+                print(f"   ⚠️  Skipping unrecognized file {file_path}")
+                continue
+            frames.setdefault(kind, []).append(readers[kind](Path(file_path)))
+        
+        return {
+            kind: dfs[0] if len(dfs) == 1 else pd.concat(dfs, ignore_index=True)
+            for kind, dfs in frames.items()
+        }
+    
     def extract_all(self):
         """Extract all data sources"""
         print("\n" + "="*50)
@@ -0,0 +1,87 @@
+"""
+Hand-off module - writes and reads phase outputs as Arrow IPC files
+Lets extract, transform and load run as separate processes or machines
+"""
+
+import json
+from pathlib import Path
+import pyarrow as pa
+import pyarrow.feather as feather
+
+
+class PhaseHandoff:
+    """Stores one phase's DataFrames as Arrow IPC (Feather v2) files"""
+    
+    MANIFEST = 'manifest.json'
+    
+    def __init__(self, path):
+        self.path = Path(path)
+    
+    def exists(self):
+        """True if a complete hand-off has been written here"""
+        return (self.path / self.MANIFEST).exists()
+    
+    def write(self, data):
+        """Write each DataFrame to <name>.arrow, then the manifest"""
+        print(f"\n💾 Writing hand-off files to {self.path}")
+        self.path.mkdir(parents=True, exist_ok=True)
+        
+        # Unmark first, so a crash mid-write never leaves an old manifest over new files
+        (self.path / self.MANIFEST).unlink(missing_ok=True)
+        
+        # Drop tables from an earlier run that this one doesn't produce
+        for stale in self.path.glob('*.arrow'):
+            if stale.stem not in data:
+                stale.unlink()
+        
+        tables = {}
+        for name, df in data.items():
+            table = pa.Table.from_pandas(df)
+            
+            # Uncompressed so readers can memory-map it without decoding
+            tmp_path = self.path / f"{name}.arrow.tmp"
+            feather.write_feather(table, tmp_path, compression='uncompressed')
+            tmp_path.replace(self.path / f"{name}.arrow")
+            
+            tables[name] = table.num_rows
+            print(f"   {name}: {table.num_rows:,} rows")
+        
+        # Manifest last: its presence marks the hand-off as complete
+        with open(self.path / self.MANIFEST, 'w') as f:
+            json.dump({'tables': tables}, f, indent=2)
+        
+        print("✅ Hand-off written")
+    
+    def read(self, memory_map=True):
+        """Read all DataFrames back (memory-mapped, no parsing)
+        
+        With memory_map=True the columns are read-only views of the files:
+        consumers must copy a frame (or replace whole columns) before
+        modifying values in place.
+        """
+        print(f"\n📂 Reading hand-off files from {self.path}")
+        
+        if not self.exists():
+            raise FileNotFoundError(f"No complete hand-off in {self.path} (missing {self.MANIFEST})")
+        
+        with open(self.path / self.MANIFEST) as f:
+            manifest = json.load(f)
+        
+        data = {}
+        for name in manifest['tables']:
+            file_path = self.path / f"{name}.arrow"
+            
+            if memory_map:
+                # Buffers point straight into the mapped file
+                source = pa.memory_map(str(file_path), 'r')
+            else:
+                source = pa.OSFile(str(file_path), 'r')
+            
+            table = pa.ipc.open_file(source).read_all()
+            
+            # split_blocks avoids consolidating columns into new arrays
+            data[name] = table.to_pandas(split_blocks=True)
+            print(f"   {name}: {len(data[name]):,} rows")
+        
+        print("✅ Hand-off loaded")
+        return data
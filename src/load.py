@@ -3,10 +3,31 @@ Load module - loads transformed data into PostgreSQL warehouse
 Handles dimension and fact table loading
 """
 
+import io
+from datetime import timedelta
 import psycopg2
 from psycopg2.extras import execute_values
+import numpy as np
 import pandas as pd
 from config import config
+from src.pricing import PlanPriceIndex
+from src.sessions import EventSessionizer
+from src.stats import WarehouseStats
+from src.export import MetricExporter
+
+
+# Secondary indexes on fact_subscriptions (see sql/schema.sql), rebuilt after bulk loads
+FACT_INDEXES = {
+    'idx_fact_user': 'user_key',
+    'idx_fact_date': 'date_key',
+    'idx_fact_event': 'event_type',
+    'idx_fact_batch': 'batch_id'
+}
+
+# Unique indexes the inserts rely on (ON CONFLICT), kept during bulk loads too
+FACT_UNIQUE_INDEXES = {
+    'idx_fact_subscription_id': 'subscription_id'
+}
 
 
 class DataLoader:
@@ -15,6 +36,10 @@ class DataLoader:
     def __init__(self):
         self.conn = None
         self.cursor = None
+        
+        # Current load batch and what it is expected to contain
+        self.batch_id = None
+        self.batch_expected = {'rows': 0, 'mrr': 0.0, 'skipped_ids': [], 'skipped_mrr': 0.0}
     
     def connect(self):
         """Connect to PostgreSQL database"""
@@ -36,6 +61,31 @@ class DataLoader:
             self.conn.close()
         print("🔌 Disconnected from database")
     
+    def start_batch(self):
+        """Register a new load batch and remember its batch_id"""
+        self.cursor.execute("""
+            INSERT INTO etl_batches (status)
+            VALUES ('running')
+            RETURNING batch_id
+        """)
+        self.batch_id = self.cursor.fetchone()[0]
+        self.batch_expected = {'rows': 0, 'mrr': 0.0, 'skipped_ids': [], 'skipped_mrr': 0.0}
+        self.conn.commit()
+        
+        print(f"🏷️  Started load batch #{self.batch_id}")
+        return self.batch_id
+    
+    def finish_batch(self, status):
+        """Record the final status of the current batch"""
+        self.cursor.execute("""
+            UPDATE etl_batches
+            SET status = %s,
+                rows_loaded = %s,
+                finished_at = CURRENT_TIMESTAMP
+            WHERE batch_id = %s
+        """, (status, self.batch_expected['rows'] - len(self.batch_expected['skipped_ids']), self.batch_id))
+        self.conn.commit()
+    
     def load_users(self, users_df):
         """Load users into dim_users table"""
         print("\n📥 Loading users to dim_users...")
@@ -62,46 +112,164 @@ class DataLoader:
                 company_size = EXCLUDED.company_size,
                 industry = EXCLUDED.industry,
                 updated_at = CURRENT_TIMESTAMP
+            RETURNING (xmax = 0) AS inserted
         """
         
         try:
-            execute_values(self.cursor, query, users_data)
+            results = execute_values(self.cursor, query, users_data, fetch=True)
+            
+            # Only brand-new rows change the table's running count
+            inserted = sum(1 for (is_insert,) in results if is_insert)
+            WarehouseStats(self.cursor).increment('dim_users', inserted)
+            
             self.conn.commit()
-            print(f"✅ Loaded {len(users_data)} users")
+            print(f"✅ Loaded {len(users_data)} users ({inserted} new)")
         except Exception as e:
             self.conn.rollback()
             print(f"❌ Error loading users: {e}")
             raise
     
     def get_user_keys(self, user_ids):
-        """Get user_key for given user_ids"""
+        """Get user_key for given user_ids (Series indexed by user_id, for .map)"""
+        user_ids = pd.Series(user_ids, dtype=object).dropna().drop_duplicates()
+        
+        # Large batches: COPY ids into a temp table and join instead of ANY(%s)
+        if len(user_ids) >= config.KEY_LOOKUP_TEMP_TABLE_MIN:
+            return self._get_user_keys_via_temp_table(user_ids)
+        
         query = """
             SELECT user_id, user_key
             FROM dim_users
             WHERE user_id = ANY(%s)
         """
         
-        self.cursor.execute(query, (list(user_ids),))
+        self.cursor.execute(query, (user_ids.tolist(),))
         results = self.cursor.fetchall()
         
-        # Return as dictionary
-        return {user_id: user_key for user_id, user_key in results}
+        return pd.Series(
+            [user_key for _, user_key in results],
+            index=[user_id for user_id, _ in results],
+            dtype='int64'
+        )
     
-    def get_plan_keys(self, plan_ids):
-        """Get plan_key for given plan_ids"""
+    def _get_user_keys_via_temp_table(self, user_ids):
+        """Resolve many user_ids with COPY + join, streamed back in chunks"""
+        self.cursor.execute("DROP TABLE IF EXISTS tmp_user_ids")
+        self.cursor.execute("CREATE TEMP TABLE tmp_user_ids (user_id VARCHAR(50)) ON COMMIT DROP")
+        
+        buffer = io.StringIO()
+        user_ids.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        self.cursor.copy_expert("COPY tmp_user_ids (user_id) FROM STDIN WITH (FORMAT csv)", buffer)
+        
+        # Real row counts so the planner picks a hash join
+        self.cursor.execute("ANALYZE tmp_user_ids")
+        
         query = """
-            SELECT plan_id, plan_key
-            FROM dim_plans
-            WHERE plan_id = ANY(%s)
+            SELECT u.user_id, u.user_key
+            FROM tmp_user_ids t
+            JOIN dim_users u ON u.user_id = t.user_id
         """
         
-        self.cursor.execute(query, (list(plan_ids),))
-        results = self.cursor.fetchall()
+        # Server-side cursor: only one chunk of rows in Python at a time
+        chunk_size = config.KEY_LOOKUP_CHUNK_SIZE
+        id_chunks, key_chunks = [], []
+        
+        with self.conn.cursor(name='user_key_lookup') as cursor:
+            cursor.itersize = chunk_size
+            cursor.execute(query)
+            
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                ids, keys = zip(*rows)
+                id_chunks.append(np.array(ids, dtype=object))
+                key_chunks.append(np.fromiter(keys, dtype=np.int64, count=len(keys)))
+        
+        self.cursor.execute("DROP TABLE tmp_user_ids")
+        
+        if not id_chunks:
+            return pd.Series([], dtype='int64')
+        
+        return pd.Series(np.concatenate(key_chunks), index=np.concatenate(id_chunks))
+    
+    def get_plan_keys(self, plan_ids, event_dates):
+        """Get plan_key of the price version in effect on each event date"""
+        price_index = PlanPriceIndex.from_database(cursor=self.cursor)
+        return price_index.resolve(plan_ids, event_dates)['plan_key']
+    
+    def choose_load_mode(self, batch_rows):
+        """Decide bulk mode from the batch-to-table size ratio"""
+        table_rows = WarehouseStats(self.cursor).get_counts('estimate', ['fact_subscriptions'])['fact_subscriptions']
+        ratio = batch_rows / max(table_rows or 0, 1)
+        
+        bulk = batch_rows >= config.BULK_LOAD_MIN_ROWS and ratio >= config.BULK_LOAD_RATIO
+        return bulk, ratio
+    
+    def drop_fact_indexes(self):
+        """Drop secondary indexes on fact_subscriptions before a backfill"""
+        print("   🧱 Bulk mode: dropping secondary indexes during load")
+        
+        for name in FACT_INDEXES:
+            self.cursor.execute(f"DROP INDEX IF EXISTS {name}")
+        self.conn.commit()
+    
+    def rebuild_fact_indexes(self):
+        """Recreate fact_subscriptions secondary indexes without blocking writers"""
+        print("   🧱 Rebuilding secondary indexes concurrently...")
+        self.ensure_fact_indexes()
+    
+    def ensure_fact_indexes(self):
+        """Create missing fact indexes and replace ones left INVALID by a failed build"""
+        indexes = {**FACT_INDEXES, **FACT_UNIQUE_INDEXES}
+        
+        self.cursor.execute("""
+            SELECT c.relname, i.indisvalid, i.indisunique
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE i.indrelid = 'fact_subscriptions'::regclass
+                AND c.relname = ANY(%s)
+        """, (list(indexes),))
+        
+        # A failed CREATE INDEX CONCURRENTLY leaves an INVALID index behind,
+        # which IF NOT EXISTS would then skip forever. An index that should be
+        # unique but isn't (older schema) is replaced the same way.
+        valid = {
+            name: is_valid and (is_unique or name not in FACT_UNIQUE_INDEXES)
+            for name, is_valid, is_unique in self.cursor.fetchall()
+        }
+        invalid = [name for name, is_valid in valid.items() if not is_valid]
+        missing = [name for name in indexes if not valid.get(name)]
+        if not missing:
+            return
+        
+        if invalid:
+            print(f"   🧱 Dropping invalid indexes: {', '.join(invalid)}")
+        
+        # CREATE INDEX CONCURRENTLY can't run inside a transaction block
+        self.conn.commit()
+        self.conn.autocommit = True
+        try:
+            for name in invalid:
+                self.cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            for name in missing:
+                unique = 'UNIQUE ' if name in FACT_UNIQUE_INDEXES else ''
+                self.cursor.execute(
+                    f"CREATE {unique}INDEX CONCURRENTLY IF NOT EXISTS {name} ON fact_subscriptions({indexes[name]})"
+                )
+        finally:
+            self.conn.autocommit = False
         
-        # Return as dictionary
-        return {plan_id: plan_key for plan_id, plan_key in results}
+        print(f"   🧱 Built indexes: {', '.join(missing)}")
     
-    def load_subscriptions(self, subs_df):
+    def analyze_fact_table(self):
+        """Refresh planner statistics after a large load"""
+        print("   📈 Running ANALYZE fact_subscriptions")
+        self.cursor.execute("ANALYZE fact_subscriptions")
+        self.conn.commit()
+    
+    def load_subscriptions(self, subs_df, bulk=None):
         """Load subscriptions into fact_subscriptions table"""
         print("\n📥 Loading subscriptions to fact_subscriptions...")
         
@@ -109,13 +277,15 @@ class DataLoader:
         user_ids = subs_df['user_id'].unique()
         user_key_map = self.get_user_keys(user_ids)
         
-        # Get plan keys
-        plan_ids = subs_df['plan_id'].unique()
-        plan_key_map = self.get_plan_keys(plan_ids)
-        
         # Add foreign keys to dataframe
         subs_df['user_key'] = subs_df['user_id'].map(user_key_map)
-        subs_df['plan_key'] = subs_df['plan_id'].map(plan_key_map)
+        
+        # Plan keys normally come from the transform's as-of price join
+        if 'plan_key' not in subs_df.columns or subs_df['plan_key'].isna().any():
+            fallback = self.get_plan_keys(subs_df['plan_id'], subs_df['event_date'])
+            if 'plan_key' in subs_df.columns:
+                fallback = subs_df['plan_key'].fillna(fallback)
+            subs_df['plan_key'] = fallback
         
         # Check for any missing keys
         missing_users = subs_df['user_key'].isna().sum()
@@ -132,45 +302,439 @@ class DataLoader:
         # Prepare data for insertion
         subs_data = [
             (
+                row['subscription_id'],
                 int(row['user_key']),
                 int(row['plan_key']),
                 row['date_key'],
                 row['event_type'],
-                row['mrr_amount']
+                row['mrr_amount'],
+                self.batch_id
             )
             for _, row in subs_df.iterrows()
         ]
         
-        # Insert data
+        # Insert data (events re-sent with a known subscription_id are skipped)
         query = """
-            INSERT INTO fact_subscriptions (user_key, plan_key, date_key, event_type, mrr_amount)
+            INSERT INTO fact_subscriptions
+                (subscription_id, user_key, plan_key, date_key, event_type, mrr_amount, batch_id)
             VALUES %s
+            ON CONFLICT (subscription_id) DO NOTHING
+            RETURNING subscription_id
         """
         
+        # Backfills: skip per-row index maintenance, rebuild once afterwards
+        auto_bulk, ratio = self.choose_load_mode(len(subs_data))
+        bulk = auto_bulk if bulk is None else bulk
+        if bulk:
+            self.drop_fact_indexes()
+        
         try:
-            execute_values(self.cursor, query, subs_data)
+            inserted = execute_values(self.cursor, query, subs_data, fetch=True)
+            WarehouseStats(self.cursor).increment('fact_subscriptions', len(inserted))
+            
+            # Same transaction: facts never land without their state update
+            self.update_subscription_state(commit=False)
             self.conn.commit()
-            print(f"✅ Loaded {len(subs_data)} subscription events")
+            
+            # Expected totals for the batch-scoped verification: everything sent,
+            # and which of it ON CONFLICT skipped as loaded by an earlier batch
+            inserted_ids = {subscription_id for (subscription_id,) in inserted}
+            skipped = subs_df[~subs_df['subscription_id'].isin(inserted_ids)]
+            self.batch_expected['rows'] += len(subs_df)
+            self.batch_expected['mrr'] += float(subs_df.loc[subs_df['event_type'] != 'cancel', 'mrr_amount'].sum())
+            self.batch_expected['skipped_ids'].extend(skipped['subscription_id'])
+            self.batch_expected['skipped_mrr'] += float(skipped.loc[skipped['event_type'] != 'cancel', 'mrr_amount'].sum())
+            
+            print(f"✅ Loaded {len(inserted)} subscription events ({len(skipped)} already loaded)")
         except Exception as e:
             self.conn.rollback()
             print(f"❌ Error loading subscriptions: {e}")
             raise
+        finally:
+            # Indexes come back even if the insert failed
+            if bulk:
+                self.rebuild_fact_indexes()
+        
+        if bulk or ratio >= config.ANALYZE_RATIO:
+            self.analyze_fact_table()
     
-    def get_load_statistics(self):
-        """Get row counts from all tables"""
-        print("\n📊 Warehouse Statistics:")
+    def update_subscription_state(self, batch_id=None, commit=True):
+        """Update per-user current state for users touched by the batch"""
+        batch_id = batch_id or self.batch_id
+        print(f"\n🔄 Updating subscription state for batch #{batch_id}...")
         
-        tables = ['dim_users', 'dim_plans', 'dim_dates', 'fact_subscriptions']
+        # Latest batch event per user, plus its earliest event date
+        summarize_query = """
+            CREATE TEMP TABLE batch_state ON COMMIT DROP AS
+            SELECT DISTINCT ON (user_key)
+                user_key, plan_key, event_type, mrr_amount, date_key, sub_key,
+                MIN(date_key) OVER (PARTITION BY user_key) AS first_date_key,
+                COUNT(*) OVER (PARTITION BY user_key) AS batch_events
+            FROM fact_subscriptions
+            WHERE batch_id = %s
+            ORDER BY user_key, date_key DESC, sub_key DESC
+        """
+        
+        # Late/back-dated events: replay only that user's suffix of history
+        replay_query = """
+            WITH late AS (
+                SELECT b.user_key, b.first_date_key
+                FROM batch_state b
+                JOIN subscription_state s ON s.user_key = b.user_key
+                WHERE b.first_date_key < s.last_date_key
+            ),
+            replayed AS (
+                SELECT DISTINCT ON (f.user_key)
+                    f.user_key, f.plan_key, f.event_type, f.mrr_amount, f.date_key, f.sub_key
+                FROM fact_subscriptions f
+                JOIN late l ON f.user_key = l.user_key AND f.date_key >= l.first_date_key
+                ORDER BY f.user_key, f.date_key DESC, f.sub_key DESC
+            )
+            UPDATE batch_state b
+            SET plan_key = r.plan_key,
+                event_type = r.event_type,
+                mrr_amount = r.mrr_amount,
+                date_key = r.date_key,
+                sub_key = r.sub_key
+            FROM replayed r
+            WHERE b.user_key = r.user_key
+        """
+        
+        upsert_query = """
+            INSERT INTO subscription_state
+                (user_key, plan_key, last_event_type, current_mrr,
+                 last_date_key, last_event_date, last_sub_key, event_count)
+            SELECT
+                user_key, plan_key, event_type,
+                CASE WHEN event_type = 'cancel' THEN 0 ELSE mrr_amount END,
+                date_key, TO_DATE(date_key::TEXT, 'YYYYMMDD'), sub_key, batch_events
+            FROM batch_state
+            ON CONFLICT (user_key)
+            DO UPDATE SET
+                plan_key = EXCLUDED.plan_key,
+                last_event_type = EXCLUDED.last_event_type,
+                current_mrr = EXCLUDED.current_mrr,
+                last_date_key = EXCLUDED.last_date_key,
+                last_event_date = EXCLUDED.last_event_date,
+                last_sub_key = EXCLUDED.last_sub_key,
+                event_count = subscription_state.event_count + EXCLUDED.event_count,
+                updated_at = CURRENT_TIMESTAMP
+        """
         
-        for table in tables:
-            query = f"SELECT COUNT(*) FROM {table}"
+        try:
+            self.cursor.execute(summarize_query, (batch_id,))
+            self.cursor.execute(replay_query)
+            late_users = self.cursor.rowcount
+            self.cursor.execute(upsert_query)
+            touched_users = self.cursor.rowcount
+            if commit:
+                self.conn.commit()
+            
+            print(f"✅ Updated state for {touched_users} users ({late_users} replayed for late events)")
+        except Exception as e:
+            self.conn.rollback()
+            print(f"❌ Error updating subscription state: {e}")
+            raise
+    
+    def rebuild_subscription_state(self):
+        """Recompute subscription_state from the full fact history"""
+        print("\n🔄 Rebuilding subscription state from full history...")
+        
+        query = """
+            INSERT INTO subscription_state
+                (user_key, plan_key, last_event_type, current_mrr,
+                 last_date_key, last_event_date, last_sub_key, event_count)
+            SELECT DISTINCT ON (user_key)
+                user_key, plan_key, event_type,
+                CASE WHEN event_type = 'cancel' THEN 0 ELSE mrr_amount END,
+                date_key, TO_DATE(date_key::TEXT, 'YYYYMMDD'), sub_key,
+                COUNT(*) OVER (PARTITION BY user_key)
+            FROM fact_subscriptions
+            ORDER BY user_key, date_key DESC, sub_key DESC
+        """
+        
+        try:
+            self.cursor.execute("DELETE FROM subscription_state")
             self.cursor.execute(query)
-            count = self.cursor.fetchone()[0]
-            print(f"   {table}: {count:,} rows")
+            rebuilt = self.cursor.rowcount
+            self.conn.commit()
+            print(f"✅ Rebuilt state for {rebuilt} users")
+        except Exception as e:
+            self.conn.rollback()
+            print(f"❌ Error rebuilding subscription state: {e}")
+            raise
     
-    def verify_data_quality(self):
-        """Run basic data quality checks after loading"""
-        print("\n🔍 Running post-load data quality checks...")
+    def load_usage_events(self, events_df):
+        """Store new usage events and re-aggregate the days they touch"""
+        print("\n📥 Loading usage events...")
+        
+        user_key_map = self.get_user_keys(events_df['user_id'].unique())
+        user_keys = events_df['user_id'].map(user_key_map)
+        
+        missing_users = user_keys.isna().sum()
+        if missing_users > 0:
+            print(f"   ⚠️  {missing_users} usage events with missing user keys (skipped)")
+        events_df = events_df[user_keys.notna()].assign(user_key=user_keys.dropna().astype('int64'))
+        
+        try:
+            self.cursor.execute("""
+                CREATE TEMP TABLE tmp_usage_events (
+                    event_id VARCHAR(50),
+                    user_key INTEGER,
+                    event_type VARCHAR(50),
+                    feature_name VARCHAR(50),
+                    event_time TIMESTAMP
+                ) ON COMMIT DROP
+            """)
+            
+            buffer = io.StringIO()
+            events_df[['event_id', 'user_key', 'event_type', 'feature_name', 'timestamp']] \
+                .to_csv(buffer, index=False, header=False)
+            buffer.seek(0)
+            self.cursor.copy_expert("COPY tmp_usage_events FROM STDIN WITH (FORMAT csv)", buffer)
+            
+            # Re-sent events are skipped; only user-days / feature-days that gained events change
+            self.cursor.execute("""
+                INSERT INTO etl_seen_events
+                    (event_id, user_key, event_type, feature_name, event_time, batch_id)
+                SELECT DISTINCT ON (event_id)
+                    event_id, user_key, event_type, feature_name, event_time, %s
+                FROM tmp_usage_events
+                ON CONFLICT (event_id) DO NOTHING
+                RETURNING user_key, feature_name, event_time::DATE
+            """, (self.batch_id,))
+            new_rows = self.cursor.fetchall()
+            
+            user_days = {(user_key, day) for user_key, _, day in new_rows}
+            feature_days = {(feature, day) for _, feature, day in new_rows if feature is not None}
+            
+            if user_days:
+                self.rebuild_user_usage(user_days)
+            if feature_days:
+                self.rebuild_feature_usage(feature_days)
+            
+            # Events and the rollups built from them land together
+            self.conn.commit()
+            print(f"✅ Stored {len(new_rows)} new usage events "
+                  f"({len(events_df) - len(new_rows)} already loaded) for {len(user_days)} user-days")
+        except Exception as e:
+            self.conn.rollback()
+            print(f"❌ Error loading usage events: {e}")
+            raise
+    
+    def rebuild_user_usage(self, user_days):
+        """Re-sessionize the stored events of touched (user_key, day) pairs"""
+        print(f"\n🔄 Rebuilding usage rollups for {len(user_days)} user-days...")
+        
+        # A new event can extend a session from the evening before or merge
+        # into one after midnight, so the user's neighbouring days are rebuilt
+        # too; two more days either side give their sessions full context
+        days_by_user = {}
+        for user_key, day in user_days:
+            days_by_user.setdefault(user_key, set()).add(day)
+        
+        self.cursor.execute("""
+            CREATE TEMP TABLE tmp_usage_context (user_key INTEGER, day DATE) ON COMMIT DROP
+        """)
+        sessionizer = EventSessionizer(gap_minutes=config.SESSION_GAP_MINUTES)
+        users = sorted(days_by_user)
+        chunk_size = config.ROLLUP_REBUILD_CHUNK_USERS
+        rebuilt = 0
+        
+        # A chunk of users at a time keeps memory bounded on backfills
+        for start in range(0, len(users), chunk_size):
+            chunk = users[start:start + chunk_size]
+            rebuild = {
+                (user_key, day + timedelta(days=offset))
+                for user_key in chunk for day in days_by_user[user_key] for offset in (-1, 0, 1)
+            }
+            context = {
+                (user_key, day + timedelta(days=offset))
+                for user_key, day in rebuild for offset in (-1, 0, 1)
+            }
+            rebuild_keys = pd.DataFrame(
+                [(user_key, day.year * 10000 + day.month * 100 + day.day) for user_key, day in rebuild],
+                columns=['user_key', 'date_key']
+            )
+            
+            self.cursor.execute("TRUNCATE tmp_usage_context")
+            execute_values(self.cursor, "INSERT INTO tmp_usage_context (user_key, day) VALUES %s",
+                           sorted(context))
+            self.cursor.execute("ANALYZE tmp_usage_context")
+            
+            # Range scans of idx_seen_events_user_time per (user, day)
+            buffer = io.StringIO()
+            self.cursor.copy_expert("""
+                COPY (
+                    SELECT e.event_id, e.user_key, e.event_type, e.feature_name, e.event_time
+                    FROM tmp_usage_context c
+                    JOIN etl_seen_events e
+                        ON e.user_key = c.user_key
+                        AND e.event_time >= c.day AND e.event_time < c.day + 1
+                ) TO STDOUT WITH (FORMAT csv)
+            """, buffer)
+            buffer.seek(0)
+            
+            events = pd.read_csv(
+                buffer,
+                names=['event_id', 'user_id', 'event_type', 'feature_name', 'timestamp'],
+                dtype={'event_id': str, 'event_type': str, 'feature_name': str},
+                parse_dates=['timestamp']
+            )
+            
+            daily_users = sessionizer.daily_user_rollup(sessionizer.sessionize(events))
+            daily_users = daily_users.rename(columns={'user_id': 'user_key'})
+            
+            # Context-only days keep their stored rollups
+            daily_users = daily_users.merge(rebuild_keys, on=['user_key', 'date_key'])
+            
+            users_data = list(zip(
+                daily_users['user_key'].astype(int),
+                daily_users['date_key'].astype(int),
+                daily_users['events'].astype(int),
+                daily_users['sessions'].astype(int),
+                daily_users['session_seconds'].astype(int),
+                daily_users['features_used'].astype(int)
+            ))
+            
+            execute_values(self.cursor, """
+                INSERT INTO agg_daily_user_usage
+                    (user_key, date_key, events, sessions, session_seconds, features_used)
+                VALUES %s
+                ON CONFLICT (user_key, date_key)
+                DO UPDATE SET
+                    events = EXCLUDED.events,
+                    sessions = EXCLUDED.sessions,
+                    session_seconds = EXCLUDED.session_seconds,
+                    features_used = EXCLUDED.features_used
+            """, users_data)
+            rebuilt += len(users_data)
+        
+        print(f"✅ Rebuilt {rebuilt} user-day rows")
+    
+    def rebuild_feature_usage(self, feature_days):
+        """Recount touched (feature, day) rollups from stored events, in SQL"""
+        self.cursor.execute("""
+            CREATE TEMP TABLE tmp_feature_days (feature_name VARCHAR(50), day DATE) ON COMMIT DROP
+        """)
+        execute_values(self.cursor, "INSERT INTO tmp_feature_days (feature_name, day) VALUES %s",
+                       sorted(feature_days))
+        self.cursor.execute("ANALYZE tmp_feature_days")
+        
+        # Range scans of idx_seen_events_feature_time; nothing leaves the database
+        self.cursor.execute("""
+            INSERT INTO agg_daily_feature_usage (date_key, feature_name, events, users)
+            SELECT
+                TO_CHAR(f.day, 'YYYYMMDD')::INTEGER,
+                f.feature_name,
+                COUNT(*),
+                COUNT(DISTINCT e.user_key)
+            FROM tmp_feature_days f
+            JOIN etl_seen_events e
+                ON e.feature_name = f.feature_name
+                AND e.event_time >= f.day AND e.event_time < f.day + 1
+            GROUP BY f.day, f.feature_name
+            ON CONFLICT (date_key, feature_name)
+            DO UPDATE SET
+                events = EXCLUDED.events,
+                users = EXCLUDED.users
+        """)
+        print(f"✅ Rebuilt {self.cursor.rowcount} feature-day rows")
+    
+    def get_load_statistics(self, mode=None):
+        """Get row counts from all tables (estimate, tracked or exact)"""
+        mode = mode or config.STATS_MODE
+        print(f"\n📊 Warehouse Statistics ({mode}):")
+        
+        counts = WarehouseStats(self.cursor).get_counts(mode)
+        if mode == 'exact':
+            # Exact recount also resynced the running counters
+            self.conn.commit()
+        
+        for table, count in counts.items():
+            if count is None:
+                print(f"   {table}: unknown")
+            else:
+                print(f"   {table}: {count:,} rows")
+    
+    def verify_data_quality(self, full_audit=None):
+        """Run post-load data quality checks over the current batch"""
+        batch_id = self.batch_id
+        
+        # Periodic full-history audit (every FULL_AUDIT_EVERY batches)
+        if full_audit is None:
+            every = config.FULL_AUDIT_EVERY
+            full_audit = batch_id is None or (every > 0 and batch_id % every == 0)
+        
+        if full_audit:
+            return self.audit_all_data()
+        
+        print(f"\n🔍 Running post-load data quality checks for batch #{batch_id}...")
+        
+        # Orphaned subscriptions in this batch (idx_fact_batch + user_key PK lookups)
+        query = """
+            SELECT COUNT(*)
+            FROM fact_subscriptions f
+            WHERE f.batch_id = %s
+                AND NOT EXISTS (
+                    SELECT 1 FROM dim_users u WHERE u.user_key = f.user_key
+                )
+        """
+        self.cursor.execute(query, (batch_id,))
+        orphaned = self.cursor.fetchone()[0]
+        
+        if orphaned > 0:
+            print(f"   ⚠️  {orphaned} orphaned subscriptions found!")
+        else:
+            print("   ✅ No orphaned subscriptions")
+        
+        # Row count and MRR of this batch vs what was sent
+        query = """
+            SELECT 
+                COUNT(*) as row_count,
+                COUNT(DISTINCT user_key) FILTER (WHERE event_type != 'cancel') as active_users,
+                COALESCE(SUM(mrr_amount) FILTER (WHERE event_type != 'cancel'), 0) as batch_mrr
+            FROM fact_subscriptions
+            WHERE batch_id = %s
+        """
+        self.cursor.execute(query, (batch_id,))
+        row_count, active_users, batch_mrr = self.cursor.fetchone()
+        
+        # Skipped events must really have been loaded by an earlier batch
+        skipped_ids = self.batch_expected['skipped_ids']
+        already_loaded = 0
+        chunk_size = config.KEY_LOOKUP_CHUNK_SIZE
+        for start in range(0, len(skipped_ids), chunk_size):
+            self.cursor.execute("""
+                SELECT COUNT(*) FROM fact_subscriptions
+                WHERE subscription_id = ANY(%s) AND batch_id <> %s
+            """, (skipped_ids[start:start + chunk_size], batch_id))
+            already_loaded += self.cursor.fetchone()[0]
+        
+        issues = orphaned
+        expected_rows = self.batch_expected['rows'] - len(skipped_ids)
+        
+        if row_count != expected_rows or already_loaded != len(skipped_ids):
+            issues += 1
+            print(f"   ⚠️  Batch has {row_count:,} rows + {already_loaded:,} loaded earlier, "
+                  f"sent {self.batch_expected['rows']:,} ({len(skipped_ids):,} skipped as already loaded)")
+        else:
+            print(f"   ✅ Batch rows: {row_count:,} ({len(skipped_ids):,} already loaded)")
+        
+        expected_mrr = self.batch_expected['mrr'] - self.batch_expected['skipped_mrr']
+        if abs(float(batch_mrr) - expected_mrr) > 0.005:
+            issues += 1
+            print(f"   ⚠️  Batch MRR ${batch_mrr:,.2f}, expected ${expected_mrr:,.2f}")
+        else:
+            print(f"   ✅ Batch MRR: ${batch_mrr:,.2f}")
+        
+        print(f"   ✅ Active users in batch: {active_users}")
+        
+        return issues == 0
+    
+    def audit_all_data(self):
+        """Full-history checks over the whole fact table (slow on large tables)"""
+        print("\n🔍 Running full data quality audit...")
         
         # Check for orphaned subscriptions
         query = """
@@ -191,7 +755,7 @@ class DataLoader:
         query = """
             SELECT 
                 COUNT(DISTINCT user_key) as active_users,
-                SUM(mrr_amount) as total_mrr
+                COALESCE(SUM(mrr_amount), 0) as total_mrr
             FROM fact_subscriptions
             WHERE event_type != 'cancel'
         """
@@ -200,6 +764,8 @@ class DataLoader:
         
         print(f"   ✅ Active users: {result[0]}")
         print(f"   ✅ Total MRR: ${result[1]:,.2f}")
+        
+        return orphaned == 0
     
     def load_all(self, data):
         """Load all data to warehouse"""
@@ -207,25 +773,53 @@ class DataLoader:
         print("LOAD PHASE")
         print("="*50)
         
+        # Reuse a connection kept open by the caller (e.g. the watch daemon)
+        owns_connection = self.conn is None or self.conn.closed
+        
         try:
             # Connect
-            self.connect()
+            if owns_connection:
+                self.connect()
             
-            # Load dimensions
-            self.load_users(data['users'])
+            # Repair indexes an interrupted backfill dropped or left invalid
+            self.ensure_fact_indexes()
+            self.start_batch()
             
-            # Load facts
-            self.load_subscriptions(data['subscriptions'])
+            try:
+                # Load dimensions
+                self.load_users(data['users'])
+                
+                # Load facts
+                self.load_subscriptions(data['subscriptions'])
+                
+                # Load usage events (and rebuild the rollups of their days)
+                if 'usage_events' in data:
+                    self.load_usage_events(data['usage_events'])
+            except Exception:
+                # Clear the aborted transaction so the status update can run
+                self.conn.rollback()
+                self.finish_batch('failed')
+                raise
             
             # Verify
             self.get_load_statistics()
-            self.verify_data_quality()
+            passed = self.verify_data_quality()
+            self.finish_batch('loaded' if passed else 'loaded_with_issues')
             
-            print("\n✅ Load complete!")
+            print(f"\n✅ Load complete! (batch #{self.batch_id})")
             
+            # Refresh dashboard snapshots once per batch
+            if config.EXPORT_PATH:
+                try:
+                    MetricExporter(self.conn).export_all(batch_id=self.batch_id)
+                except Exception as e:
+                    # Data is loaded; the next batch re-exports everything
+                    print(f"⚠️  Metric export failed: {e}")
+        
         finally:
-            # Always disconnect
-            self.disconnect()
+            # Always disconnect (unless the connection is the caller's)
+            if owns_connection:
+                self.disconnect()
 
 
 # Test the loader
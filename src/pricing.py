@@ -0,0 +1,112 @@
+"""
+Pricing module - effective-dated plan prices
+Resolves the price that was in effect on each event date
+"""
+
+import numpy as np
+import pandas as pd
+import psycopg2
+from config import config
+
+
+class PlanPriceIndex:
+    """Sorted in-memory index of plan price versions"""
+    
+    def __init__(self, versions_df):
+        df = versions_df.copy()
+        df['effective_from'] = pd.to_datetime(df['effective_from'])
+        df['monthly_price'] = df['monthly_price'].astype(float)
+        
+        if 'plan_key' not in df.columns:
+            df['plan_key'] = pd.NA
+        df['plan_key'] = df['plan_key'].astype('Int64')
+        
+        # merge_asof needs the right side sorted on the join key
+        self.versions = df[['plan_id', 'effective_from', 'monthly_price', 'plan_key']] \
+            .sort_values('effective_from', kind='mergesort') \
+            .reset_index(drop=True)
+    
+    @classmethod
+    def from_dict(cls, prices, effective_from='1970-01-01'):
+        """Build an index with a single price version per plan (tests, no plan_keys)"""
+        return cls(pd.DataFrame({
+            'plan_id': list(prices.keys()),
+            'effective_from': effective_from,
+            'monthly_price': list(prices.values())
+        }))
+    
+    @classmethod
+    def from_database(cls, cursor=None):
+        """Load all price versions from dim_plans (once per run)"""
+        print("💲 Loading plan price versions from dim_plans...")
+        
+        query = """
+            SELECT plan_key, plan_id, effective_from, monthly_price
+            FROM dim_plans
+        """
+        
+        if cursor is not None:
+            cursor.execute(query)
+            rows = cursor.fetchall()
+        else:
+            conn = psycopg2.connect(config.db_connection_string)
+            cursor = conn.cursor()
+            
+            try:
+                cursor.execute(query)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+                conn.close()
+        
+        index = cls(pd.DataFrame(
+            rows, columns=['plan_key', 'plan_id', 'effective_from', 'monthly_price']
+        ))
+        print(f"✅ Loaded {len(index.versions)} price versions "
+              f"for {len(index.plan_ids)} plans")
+        return index
+    
+    @property
+    def plan_ids(self):
+        """All plan IDs known to the index"""
+        return sorted(self.versions['plan_id'].unique())
+    
+    @property
+    def first_plan_keys(self):
+        """plan_key of each plan's earliest price version"""
+        return self.versions.drop_duplicates('plan_id').set_index('plan_id')['plan_key']
+    
+    def resolve(self, plan_ids, event_dates):
+        """Return monthly_price and plan_key in effect for each (plan, date)"""
+        index = plan_ids.index
+        
+        left = pd.DataFrame({
+            'plan_id': plan_ids.to_numpy(),
+            'event_date': pd.to_datetime(event_dates).to_numpy(),
+            '_pos': np.arange(len(plan_ids))
+        })
+        
+        # As-of join: latest version with effective_from <= event_date
+        dated = left[left['event_date'].notna()].sort_values('event_date', kind='mergesort')
+        merged = pd.merge_asof(
+            dated,
+            self.versions,
+            left_on='event_date',
+            right_on='effective_from',
+            by='plan_id',
+            direction='backward'
+        )
+        
+        # Put results back in input order (rows without a date get no price)
+        positions = merged['_pos'].to_numpy()
+        
+        prices = np.full(len(left), np.nan)
+        prices[positions] = merged['monthly_price'].to_numpy()
+        
+        plan_keys = pd.Series(pd.NA, index=range(len(left)), dtype='Int64')
+        plan_keys.iloc[positions] = merged['plan_key'].array
+        
+        return pd.DataFrame({
+            'monthly_price': prices,
+            'plan_key': plan_keys.array
+        }, index=index)
@@ -0,0 +1,142 @@
+"""
+Sessions module - sessionizes usage events and builds daily rollups
+Vectorized with NumPy so it keeps up with very large event files
+"""
+
+import numpy as np
+import pandas as pd
+
+
+NS_PER_SECOND = 1_000_000_000
+NS_PER_DAY = 86_400 * NS_PER_SECOND
+
+
+class EventSessionizer:
+    """Splits each user's events into sessions by inactivity gap"""
+    
+    def __init__(self, gap_minutes=30):
+        self.gap = np.timedelta64(gap_minutes, 'm').astype('timedelta64[ns]')
+    
+    def sessionize(self, events_df):
+        """Sort events per user and assign a session_id to each event"""
+        print(f"\n⏱️  Sessionizing events (gap = {self.gap.astype('timedelta64[m]')})...")
+        
+        df = events_df[['event_id', 'user_id', 'event_type', 'feature_name', 'timestamp']].copy()
+        df['timestamp'] = pd.to_datetime(df['timestamp']).astype('datetime64[ns]')
+        df = df[df['user_id'].notna() & df['timestamp'].notna()]
+        
+        # Sort by (user, time) on integer codes instead of strings
+        user_codes, _ = pd.factorize(df['user_id'])
+        ts = df['timestamp'].to_numpy().view('i8')
+        order = np.lexsort((ts, user_codes))
+        
+        df = df.iloc[order].reset_index(drop=True)
+        user_codes = user_codes[order]
+        ts = ts[order]
+        
+        # New session on user change or a gap longer than the threshold
+        new_session = np.ones(len(df), dtype=bool)
+        new_session[1:] = (user_codes[1:] != user_codes[:-1]) | (np.diff(ts) > self.gap.view('i8'))
+        
+        df['session_id'] = np.cumsum(new_session)
+        df['event_date'] = df['timestamp'].dt.normalize()
+        
+        print(f"✅ Found {int(new_session.sum())} sessions in {len(df)} events")
+        return df
+    
+    def daily_user_rollup(self, sessions_df):
+        """Events, sessions, session time and features used per user per day"""
+        df = sessions_df
+        columns = ['user_id', 'event_date', 'date_key', 'events', 'sessions',
+                   'session_seconds', 'features_used']
+        
+        if df.empty:
+            return pd.DataFrame(columns=columns)
+        
+        # Rows are sorted by (user, time), so each user-day is a contiguous run
+        user_codes, _ = pd.factorize(df['user_id'])
+        ts = df['timestamp'].to_numpy().view('i8')
+        days = ts // NS_PER_DAY
+        
+        new_group = np.ones(len(df), dtype=bool)
+        new_group[1:] = (user_codes[1:] != user_codes[:-1]) | (days[1:] != days[:-1])
+        group = np.cumsum(new_group) - 1
+        group_starts = np.flatnonzero(new_group)
+        n_groups = len(group_starts)
+        
+        events = np.bincount(group, minlength=n_groups)
+        
+        # A session counts toward the day it started on
+        session_ids = df['session_id'].to_numpy()
+        new_session = np.ones(len(df), dtype=bool)
+        new_session[1:] = session_ids[1:] != session_ids[:-1]
+        session_starts = np.flatnonzero(new_session)
+        session_ends = np.r_[session_starts[1:], len(df)] - 1
+        durations = (ts[session_ends] - ts[session_starts]) // NS_PER_SECOND
+        
+        sessions = np.bincount(group[session_starts], minlength=n_groups)
+        session_seconds = np.bincount(group[session_starts], weights=durations, minlength=n_groups)
+        
+        # Distinct (user-day, feature) pairs
+        feature_codes, feature_names = pd.factorize(df['feature_name'])
+        n_features = max(len(feature_names), 1)
+        used = feature_codes >= 0
+        pairs = np.unique(group[used] * n_features + feature_codes[used])
+        features_used = np.bincount(pairs // n_features, minlength=n_groups)
+        
+        rollup = pd.DataFrame({
+            'user_id': df['user_id'].to_numpy()[group_starts],
+            'event_date': df['event_date'].to_numpy()[group_starts],
+            'events': events,
+            'sessions': sessions,
+            'session_seconds': session_seconds.astype('int64'),
+            'features_used': features_used
+        })
+        rollup['date_key'] = self._date_key(rollup['event_date'])
+        
+        return rollup[columns]
+    
+    def daily_feature_rollup(self, sessions_df):
+        """Usage events and distinct users per feature per day"""
+        df = sessions_df[sessions_df['feature_name'].notna()]
+        columns = ['event_date', 'date_key', 'feature_name', 'events', 'users']
+        
+        if df.empty:
+            return pd.DataFrame(columns=columns)
+        
+        days = df['timestamp'].to_numpy().view('i8') // NS_PER_DAY
+        first_day = days.min()
+        feature_codes, feature_names = pd.factorize(df['feature_name'])
+        user_codes, user_ids = pd.factorize(df['user_id'])
+        
+        # One integer key per (day, feature), then per (day, feature, user)
+        keys = (days - first_day) * len(feature_names) + feature_codes
+        unique_keys, events = np.unique(keys, return_counts=True)
+        user_keys = np.unique(keys * len(user_ids) + user_codes)
+        _, users = np.unique(user_keys // len(user_ids), return_counts=True)
+        
+        rollup = pd.DataFrame({
+            'event_date': pd.to_datetime((unique_keys // len(feature_names) + first_day) * NS_PER_DAY),
+            'feature_name': feature_names[unique_keys % len(feature_names)],
+            'events': events,
+            'users': users
+        })
+        rollup['date_key'] = self._date_key(rollup['event_date'])
+        
+        return rollup[columns].sort_values(['event_date', 'feature_name']).reset_index(drop=True)
+    
+    @staticmethod
+    def _date_key(dates):
+        """YYYYMMDD integer keys (arithmetic, no string formatting)"""
+        return dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day
+    
+    def transform(self, events_df):
+        """Sessionize events and return both daily rollup tables"""
+        sessions = self.sessionize(events_df)
+        
+        daily_users = self.daily_user_rollup(sessions)
+        daily_features = self.daily_feature_rollup(sessions)
+        
+        print(f"✅ Built {len(daily_users)} user-day and {len(daily_features)} feature-day rollups")
+        
+        return daily_users, daily_features
@@ -0,0 +1,102 @@
+"""
+Warehouse statistics - row counts without full table scans
+Catalog estimates by default, loader-maintained counters, exact on request
+"""
+
+
+# Tables reported in warehouse statistics
+WAREHOUSE_TABLES = ['dim_users', 'dim_plans', 'dim_dates', 'fact_subscriptions']
+
+STATS_MODES = ['estimate', 'tracked', 'exact']
+
+
+class WarehouseStats:
+    """Provides table row counts using an open cursor"""
+    
+    def __init__(self, cursor):
+        self.cursor = cursor
+    
+    def estimated_counts(self, tables=WAREHOUSE_TABLES):
+        """Row estimates from pg_class (summed over partitions if any)"""
+        query = """
+            SELECT
+                parent.relname,
+                SUM(child.reltuples) FILTER (WHERE child.reltuples >= 0)::BIGINT
+            FROM pg_class parent
+            LEFT JOIN pg_inherits i ON i.inhparent = parent.oid
+            JOIN pg_class child ON child.oid = COALESCE(i.inhrelid, parent.oid)
+            WHERE parent.relname = ANY(%s)
+                AND parent.relnamespace = to_regnamespace(current_schema())
+            GROUP BY parent.relname
+        """
+        self.cursor.execute(query, (list(tables),))
+        
+        # NULL means the table was never analyzed (reltuples = -1)
+        return {table: count for table, count in self.cursor.fetchall() if count is not None}
+    
+    def tracked_counts(self, tables=WAREHOUSE_TABLES):
+        """Exact running counts kept in etl_table_counts by the loader"""
+        query = """
+            SELECT table_name, row_count
+            FROM etl_table_counts
+            WHERE table_name = ANY(%s)
+        """
+        self.cursor.execute(query, (list(tables),))
+        return dict(self.cursor.fetchall())
+    
+    def exact_counts(self, tables=WAREHOUSE_TABLES):
+        """Full COUNT(*) per table - also resyncs the running counters"""
+        counts = {}
+        
+        for table in tables:
+            self.cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            counts[table] = self.cursor.fetchone()[0]
+            self.set_count(table, counts[table])
+        
+        return counts
+    
+    def get_counts(self, mode='estimate', tables=WAREHOUSE_TABLES):
+        """Get row counts using the given mode: estimate, tracked or exact"""
+        if mode not in STATS_MODES:
+            raise ValueError(f"Unknown stats mode '{mode}' (expected one of {STATS_MODES})")
+        
+        if mode == 'exact':
+            return self.exact_counts(tables)
+        
+        if mode == 'estimate':
+            primary, fallback = self.estimated_counts, self.tracked_counts
+        else:
+            primary, fallback = self.tracked_counts, self.estimated_counts
+        
+        counts = primary(tables)
+        
+        # Fill gaps (never analyzed / not tracked yet) from the other source
+        missing = [table for table in tables if table not in counts]
+        if missing:
+            counts.update(fallback(missing))
+        
+        return {table: counts.get(table) for table in tables}
+    
+    def increment(self, table, delta):
+        """Add delta to a table's running count (caller commits)"""
+        query = """
+            INSERT INTO etl_table_counts (table_name, row_count)
+            VALUES (%s, %s)
+            ON CONFLICT (table_name)
+            DO UPDATE SET
+                row_count = etl_table_counts.row_count + EXCLUDED.row_count,
+                updated_at = CURRENT_TIMESTAMP
+        """
+        self.cursor.execute(query, (table, delta))
+    
+    def set_count(self, table, count):
+        """Overwrite a table's running count (caller commits)"""
+        query = """
+            INSERT INTO etl_table_counts (table_name, row_count)
+            VALUES (%s, %s)
+            ON CONFLICT (table_name)
+            DO UPDATE SET
+                row_count = EXCLUDED.row_count,
+                updated_at = CURRENT_TIMESTAMP
+        """
+        self.cursor.execute(query, (table, count))
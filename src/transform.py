@@ -4,19 +4,88 @@ Calculates MRR, identifies churn, enriches data
 """
 
 import pandas as pd
+import io
+import multiprocessing
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
 from datetime import datetime
+from pathlib import Path
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+from config import config
+from src.pricing import PlanPriceIndex
+from src.validator import ValidationPolicy
+
+
+# Source columns, used when a micro-batch has no file for a source
+USER_COLUMNS = ['user_id', 'email', 'signup_date', 'company_size', 'industry']
+SUBSCRIPTION_COLUMNS = ['subscription_id', 'user_id', 'plan_id', 'event_type', 'event_date']
+
+# Usage event columns handed to the loader
+USAGE_EVENT_COLUMNS = ['event_id', 'user_id', 'event_type', 'feature_name', 'timestamp']
+
+
+# Subscription columns transform_user_data writes; the rest pass through unchanged
+SUBSCRIPTION_COMPUTED_COLUMNS = ['event_date', 'mrr_amount', 'plan_key', 'date_key']
+
+
+def _read_shard(path, shard):
+    """Rows of one shard from a memory-mapped Arrow file, with their original labels"""
+    table = feather.read_table(path, memory_map=True)
+    table = table.filter(pc.equal(table['_shard'], shard))
+    
+    df = table.drop(['_shard', '_row']).to_pandas()
+    df.index = table['_row'].to_numpy()
+    return df
+
+
+def _transform_shard(task):
+    """Process pool worker: per-user transform of one shard (logs muted)
+    
+    Reads its own rows from the shared Arrow files and returns all of its
+    users, but only the computed subscription columns.
+    """
+    price_index, shard_dir, shard = task
+    users_df = _read_shard(Path(shard_dir) / 'users.arrow', shard)
+    subs_df = _read_shard(Path(shard_dir) / 'subscriptions.arrow', shard)
+    
+    with redirect_stdout(io.StringIO()):
+        users_clean, subs_with_mrr = DataTransformer(price_index=price_index).transform_user_data(users_df, subs_df)
+    
+    return users_clean, subs_with_mrr[SUBSCRIPTION_COMPUTED_COLUMNS]
+
+
+def _write_shards(df, shard, path):
+    """Write df once, tagged with each row's shard and label, for the workers to filter"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.append_column('_shard', pa.array(shard.to_numpy(), type=pa.int32()))
+    table = table.append_column('_row', pa.array(df.index.to_numpy()))
+    feather.write_feather(table, path, compression='uncompressed')
+
+
+def _concat_shards(frames):
+    """Merge shard outputs back into input order"""
+    non_empty = [df for df in frames if len(df) > 0] or frames[:1]
+    return pd.concat(non_empty).sort_index(kind='mergesort')
 
 
 class DataTransformer:
     """Handles all data transformations"""
     
-    def __init__(self):
-        # Plan pricing lookup
-        self.plan_prices = {
-            'free': 0.00,
-            'pro': 29.00,
-            'enterprise': 99.00
-        }
+    # Minimum subscription rows per shard before parallel transform is used
+    MIN_SHARD_ROWS = 50_000
+    
+    def __init__(self, price_index=None, seen_ids=None, validation_policy=None):
+        # Effective-dated plan prices (loaded from dim_plans once per run)
+        self.price_index = price_index or PlanPriceIndex.from_database()
+        
+        # Cross-run seen-sets of subscription/event ids (None = no cross-run dedupe)
+        self.seen_ids = seen_ids
+        
+        # Which quality checks run on every row and which on a sample
+        self.validation_policy = validation_policy or ValidationPolicy()
     
     def clean_users(self, users_df):
         """Clean and validate user data"""
@@ -49,6 +118,12 @@ class DataTransformer:
         
         df = subs_df.copy()
         
+        # subscription_id is the loader's ON CONFLICT key: rows without one would be re-inserted every run
+        missing_ids = df['subscription_id'].isna()
+        if missing_ids.any():
+            print(f"   ⚠️  {missing_ids.sum()} subscriptions without subscription_id (skipped)")
+            df = df[~missing_ids]
+        
         # Remove duplicates
         original_count = len(df)
         df = df.drop_duplicates(subset=['subscription_id'])
@@ -63,7 +138,7 @@ class DataTransformer:
         df = df[df['event_type'].isin(valid_events)]
         
         # Validate plan IDs
-        valid_plans = ['free', 'pro', 'enterprise']
+        valid_plans = self.price_index.plan_ids
         df = df[df['plan_id'].isin(valid_plans)]
         
         print(f"✅ Cleaned {len(df)} subscription events")
@@ -75,11 +150,26 @@ class DataTransformer:
         
         df = subs_df.copy()
         
-        # Add MRR based on plan
-        df['mrr_amount'] = df['plan_id'].map(self.plan_prices)
+        # Add MRR based on the plan price in effect on the event date
+        prices = self.price_index.resolve(df['plan_id'], df['event_date'])
+        df['mrr_amount'] = prices['monthly_price']
+        
+        # Keep the matching price version so the loader doesn't re-resolve it
+        df['plan_key'] = prices['plan_key']
         
         # For cancellations, MRR should be 0
-        df.loc[df['event_type'] == 'cancel', 'mrr_amount'] = 0
+        is_cancel = df['event_type'] == 'cancel'
+        df.loc[is_cancel, 'mrr_amount'] = 0
+        
+        # Cancels dated before the plan's first version still need a plan_key
+        early_cancels = is_cancel & prices['monthly_price'].isna()
+        df.loc[early_cancels, 'plan_key'] = df.loc[early_cancels, 'plan_id'].map(self.price_index.first_plan_keys)
+        
+        # Other events have no price yet (a NaN mrr_amount would be loaded as numeric NaN)
+        unpriced = df['mrr_amount'].isna()
+        if unpriced.any():
+            print(f"   ⚠️  {unpriced.sum()} events dated before their plan's first price version (skipped)")
+            df = df[~unpriced]
         
         print(f"✅ Calculated MRR for {len(df)} events")
         print(f"   Total MRR: ${df[df['event_type'] != 'cancel']['mrr_amount'].sum():,.2f}")
@@ -91,33 +181,30 @@ class DataTransformer:
         df['date_key'] = df[date_column].dt.strftime('%Y%m%d').astype(int)
         return df
     
-    def validate_data(self, users_df, subs_df):
-        """Run basic data quality checks"""
+    def validate_data(self, users_df, subs_df, known_user_ids=()):
+        """Run basic data quality checks (soft checks sampled on large batches)"""
         print("\n🔍 Running data quality checks...")
         
-        issues = []
-        
-        # Check for nulls in critical fields
-        if users_df['user_id'].isnull().any():
-            issues.append("NULL user_ids found in users")
-        
-        if subs_df['subscription_id'].isnull().any():
-            issues.append("NULL subscription_ids found")
-        
-        # Check for orphaned subscriptions (user not in users table)
-        user_ids = set(users_df['user_id'])
-        sub_user_ids = set(subs_df['user_id'])
-        orphaned = sub_user_ids - user_ids
-        
-        if orphaned:
-            issues.append(f"Found {len(orphaned)} subscriptions with no matching user")
-            print(f"   ⚠️  {len(orphaned)} orphaned subscriptions (will be filtered)")
-        
-        # Check for future dates
+        user_ids = set(users_df['user_id']) | set(known_user_ids)
         today = pd.Timestamp.now()
-        future_subs = subs_df[subs_df['event_date'] > today]
-        if len(future_subs) > 0:
-            issues.append(f"Found {len(future_subs)} subscriptions with future dates")
+        
+        issues = self.validation_policy.run_checks([
+            # Hard: the loader upserts users on user_id and dedupes on subscription_id
+            ('users.user_id not null', users_df, lambda d: d['user_id'].isnull(), True,
+             "NULL user_ids found in users ({count})"),
+            ('subscriptions.subscription_id not null', subs_df,
+             lambda d: d['subscription_id'].isnull(), True,
+             "NULL subscription_ids found ({count})"),
+            
+            # Soft: orphans are filtered on every row afterwards anyway
+            ('subscriptions.user_id known', subs_df,
+             lambda d: ~d['user_id'].isin(user_ids), False,
+             "Found {count} subscriptions with no matching user"),
+            ('subscriptions.event_date not in future', subs_df,
+             lambda d: d['event_date'] > today, False,
+             "Found {count} subscriptions with future dates")
+        ])
+        self.validation_policy.report()
         
         if not issues:
             print("✅ All data quality checks passed!")
@@ -128,15 +215,11 @@ class DataTransformer:
         
         return issues
     
-    def transform_all(self, data):
-        """Run all transformations"""
-        print("\n" + "="*50)
-        print("TRANSFORM PHASE")
-        print("="*50)
-        
+    def transform_user_data(self, users_df, subs_df):
+        """Per-user steps: clean, price and add date keys"""
         # Clean data
-        users_clean = self.clean_users(data['users'])
-        subs_clean = self.clean_subscriptions(data['subscriptions'])
+        users_clean = self.clean_users(users_df)
+        subs_clean = self.clean_subscriptions(subs_df)
         
         # Calculate metrics
         subs_with_mrr = self.calculate_mrr(subs_clean)
@@ -145,19 +228,136 @@ class DataTransformer:
         subs_with_mrr = self.enrich_with_date_key(subs_with_mrr, 'event_date')
         users_clean = self.enrich_with_date_key(users_clean, 'signup_date')
         
+        return users_clean, subs_with_mrr
+    
+    def transform_sharded(self, users_df, subs_df, workers):
+        """Run transform_user_data on user_id hash shards in a process pool"""
+        print(f"\n🔀 Transforming in {workers} user shards...")
+        
+        # Cross-user duplicate subscription_ids would land in different shards
+        duplicated = subs_df['subscription_id'].duplicated()
+        if duplicated.any():
+            print(f"   Removed {duplicated.sum()} duplicate subscriptions")
+            subs_df = subs_df[~duplicated]
+        
+        # Same user_id -> same shard, for users and their subscriptions
+        user_shard = pd.util.hash_pandas_object(users_df['user_id'], index=False) % workers
+        subs_shard = pd.util.hash_pandas_object(subs_df['user_id'], index=False) % workers
+        
+        # No plain fork: pyarrow/numpy threads may already run in this process,
+        # and a forked child can deadlock on locks they held
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('forkserver') if 'forkserver' in methods else None
+        
+        # Inputs are written once as Arrow files instead of pickled per shard;
+        # each worker memory-maps them and materializes only its own rows
+        with tempfile.TemporaryDirectory(prefix='shards-') as shard_dir:
+            _write_shards(users_df, user_shard, Path(shard_dir) / 'users.arrow')
+            _write_shards(subs_df, subs_shard, Path(shard_dir) / 'subscriptions.arrow')
+            
+            tasks = [(self.price_index, shard_dir, i) for i in range(workers)]
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                results = list(executor.map(_transform_shard, tasks))
+        
+        # Original row labels survive, so sorting restores the serial order
+        users_clean = _concat_shards([users for users, _ in results])
+        computed = _concat_shards([subs for _, subs in results])
+        
+        # Unchanged subscription columns come from the parent's own frame
+        subs_with_mrr = subs_df.loc[computed.index]
+        subs_with_mrr = subs_with_mrr.assign(**{col: computed[col] for col in computed.columns})
+        
+        print(f"✅ Merged {len(users_clean)} users and {len(subs_with_mrr)} subscription events")
+        return users_clean, subs_with_mrr
+    
+    def drop_loaded_subscriptions(self, subs_df):
+        """Drop subscription events already loaded by an earlier run"""
+        print("\n🔁 Checking subscriptions against earlier runs...")
+        
+        seen = self.seen_ids.seen_mask('subscriptions', subs_df['subscription_id'])
+        if seen.any():
+            print(f"   Removed {seen.sum()} subscriptions loaded by earlier runs")
+        
+        return subs_df[~seen.to_numpy()]
+    
+    def drop_loaded_events(self, events_df):
+        """Drop usage events already loaded by an earlier run"""
+        print("\n🔁 Checking usage events against earlier runs...")
+        
+        seen = self.seen_ids.seen_mask('events', events_df['event_id'])
+        if seen.any():
+            print(f"   Removed {seen.sum()} usage events loaded by earlier runs")
+        
+        return events_df[~seen.to_numpy()]
+    
+    def transform_all(self, data, workers=None, known_user_ids=()):
+        """Run all transformations
+        
+        known_user_ids: users already in the warehouse, for batches that
+        carry subscriptions/events but not the users they belong to
+        """
+        print("\n" + "="*50)
+        print("TRANSFORM PHASE")
+        print("="*50)
+        
+        workers = workers or config.TRANSFORM_WORKERS
+        
+        # Micro-batches may contain only some of the sources
+        users_df = data.get('users', pd.DataFrame(columns=USER_COLUMNS))
+        subs_df = data.get('subscriptions', pd.DataFrame(columns=SUBSCRIPTION_COLUMNS))
+        
+        if self.seen_ids is not None:
+            subs_df = self.drop_loaded_subscriptions(subs_df)
+        
+        # Sharding only pays off once each shard has real work to do
+        if workers > 1 and len(subs_df) >= workers * self.MIN_SHARD_ROWS:
+            users_clean, subs_with_mrr = self.transform_sharded(users_df, subs_df, workers)
+        else:
+            users_clean, subs_with_mrr = self.transform_user_data(users_df, subs_df)
+        
         # Validate
-        self.validate_data(users_clean, subs_with_mrr)
+        self.validate_data(users_clean, subs_with_mrr, known_user_ids)
         
         # Filter out orphaned subscriptions
-        user_ids = set(users_clean['user_id'])
+        user_ids = set(users_clean['user_id']) | set(known_user_ids)
         subs_with_mrr = subs_with_mrr[subs_with_mrr['user_id'].isin(user_ids)]
         
-        print("\n✅ Transformation complete!")
-        
-        return {
+        clean_data = {
             'users': users_clean,
             'subscriptions': subs_with_mrr
         }
+        
+        # Usage events: the loader stores them and re-aggregates each day they touch
+        if 'events' in data:
+            events = data['events'][data['events']['user_id'].isin(user_ids)]
+            events = events.assign(timestamp=pd.to_datetime(events['timestamp']))
+            
+            # Stored events are keyed by event_id
+            unusable = events['event_id'].isna() | events['timestamp'].isna()
+            if unusable.any():
+                print(f"\n   ⚠️  {unusable.sum()} usage events without event_id or timestamp (skipped)")
+                events = events[~unusable]
+            
+            duplicated = events['event_id'].duplicated()
+            if duplicated.any():
+                print(f"\n   Removed {duplicated.sum()} duplicate usage events")
+                events = events[~duplicated]
+            
+            if self.seen_ids is not None:
+                events = self.drop_loaded_events(events)
+            
+            clean_data['usage_events'] = events[USAGE_EVENT_COLUMNS].reset_index(drop=True)
+        
+        # Remember what goes to the loader; ids from a failed load are
+        # still verified against the warehouse next time, so none get lost
+        if self.seen_ids is not None:
+            self.seen_ids.remember('subscriptions', subs_with_mrr['subscription_id'])
+            if 'usage_events' in clean_data:
+                self.seen_ids.remember('events', clean_data['usage_events']['event_id'])
+        
+        print("\n✅ Transformation complete!")
+        
+        return clean_data
 
 
 # Test the transformer
@@ -3,7 +3,147 @@ Data validation utilities
 Simple checks to ensure data quality
 """
 
+import math
+import time
+from statistics import NormalDist
+import numpy as np
 import pandas as pd
+from config import config
+
+
+def wilson_interval(violations, checked, confidence):
+    """Confidence bounds for a violation rate seen in a sample"""
+    if checked == 0:
+        return 0.0, 1.0
+    
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    rate = violations / checked
+    denom = 1 + z ** 2 / checked
+    center = (rate + z ** 2 / (2 * checked)) / denom
+    half = z * math.sqrt(rate * (1 - rate) / checked + z ** 2 / (4 * checked ** 2)) / denom
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+class ValidationPolicy:
+    """Runs hard checks on every row and soft checks on a sample within a time budget
+    
+    A check is (name, df, violations, hard, message): violations(df) returns
+    a boolean Series of failing rows, message is formatted with {count}.
+    """
+    
+    def __init__(self, time_budget_seconds=None, sample_above_rows=None,
+                 confidence=None, min_sample_rows=None, seed=0):
+        self.time_budget_seconds = time_budget_seconds or config.VALIDATION_TIME_BUDGET_SECONDS
+        self.sample_above_rows = sample_above_rows or config.VALIDATION_SAMPLE_ABOVE_ROWS
+        self.confidence = confidence or config.VALIDATION_CONFIDENCE
+        self.min_sample_rows = min_sample_rows or config.VALIDATION_MIN_SAMPLE_ROWS
+        self.rng = np.random.default_rng(seed)
+        
+        # Results of the last run_checks call, for the report
+        self.results = []
+        self.seconds_per_row = None
+    
+    def run_check(self, name, df, violations, hard, sample_rows=None):
+        """Run one check over all rows, or over sample_rows random rows"""
+        rows = len(df)
+        sampled = sample_rows is not None and sample_rows < rows
+        
+        # Timed with the sampling itself, so estimates include the gather cost
+        started = time.monotonic()
+        
+        if sampled:
+            # Sorted positions keep the gather close to sequential
+            positions = np.sort(self.rng.choice(rows, size=sample_rows, replace=False))
+            df = df.iloc[positions]
+        
+        failed = int(violations(df).sum())
+        elapsed = time.monotonic() - started
+        
+        checked = len(df)
+        if checked > 0:
+            self.seconds_per_row = elapsed / checked
+        
+        rate = failed / checked if checked else 0.0
+        low, high = wilson_interval(failed, checked, self.confidence) if sampled else (rate, rate)
+        
+        return {
+            'check': name,
+            'hard': hard,
+            'sampled': sampled,
+            'rows': rows,
+            'checked': checked,
+            'sample_rate': checked / rows if rows else 1.0,
+            'violations': failed,
+            'rate': rate,
+            'low': low,
+            'high': high,
+            'seconds': elapsed
+        }
+    
+    def sample_size(self, rows, soft_checks_left, deadline):
+        """Rows a soft check can afford: an even share of the remaining budget"""
+        if rows <= self.sample_above_rows:
+            return None
+        
+        remaining = max(0.0, deadline - time.monotonic())
+        share = remaining / max(soft_checks_left, 1)
+        
+        # No timing yet: start with the minimum sample and learn from it
+        if not self.seconds_per_row:
+            return min(rows, self.min_sample_rows)
+        
+        affordable = int(share / self.seconds_per_row)
+        size = max(self.min_sample_rows, affordable)
+        
+        # Drawing most of the rows costs more than checking them all
+        return None if size >= rows // 2 else size
+    
+    def run_checks(self, checks):
+        """Run hard checks exhaustively, then soft checks sampled; returns issues"""
+        deadline = time.monotonic() + self.time_budget_seconds
+        self.results = []
+        issues = []
+        
+        hard_checks = [check for check in checks if check[3]]
+        soft_checks = [check for check in checks if not check[3]]
+        
+        for i, (name, df, violations, hard, message) in enumerate(hard_checks + soft_checks):
+            sample_rows = None
+            if not hard:
+                sample_rows = self.sample_size(len(df), len(checks) - i, deadline)
+            
+            result = self.run_check(name, df, violations, hard, sample_rows)
+            self.results.append(result)
+            
+            if result['violations'] == 0:
+                continue
+            
+            if result['sampled']:
+                estimate = round(result['rate'] * result['rows'])
+                issues.append(
+                    message.format(count=f"~{estimate:,}") +
+                    f" (estimated from a {result['sample_rate']:.2%} sample; "
+                    f"{self.confidence:.0%} CI {result['low']:.3%}-{result['high']:.3%} of rows)"
+                )
+            else:
+                issues.append(message.format(count=result['violations']))
+        
+        return issues
+    
+    def report(self):
+        """Print how each check ran: exhaustive or sampled, and at what rate"""
+        for result in self.results:
+            if result['sampled']:
+                mode = (f"sampled {result['sample_rate']:.2%} "
+                        f"({result['checked']:,} of {result['rows']:,} rows)")
+                rate = (f"rate {result['rate']:.3%} "
+                        f"({self.confidence:.0%} CI {result['low']:.3%}-{result['high']:.3%})")
+            else:
+                kind = 'hard' if result['hard'] else 'soft'
+                mode = f"exhaustive, {kind} ({result['rows']:,} rows)"
+                rate = f"{result['violations']:,} violations"
+            
+            print(f"   📏 {result['check']}: {mode}, {rate}")
 
 
 class DataValidator:
@@ -60,21 +200,25 @@ class DataValidator:
         return None
     
     @staticmethod
-    def validate_users(df):
-        """Validate users dataframe"""
+    def validate_users(df, policy=None):
+        """Validate users dataframe (user_id checks exhaustive, the rest may be sampled)"""
         print("🔍 Validating users...")
+        policy = policy or ValidationPolicy()
         
         # Check required columns
         required = ['user_id', 'email', 'signup_date']
         DataValidator.check_required_columns(df, required, 'users')
         
-        # Check for nulls
-        issues = DataValidator.check_nulls(df, ['user_id', 'email'], 'users')
-        
-        # Check duplicates
-        dup_issue = DataValidator.check_duplicates(df, ['user_id'], 'users')
-        if dup_issue:
-            issues.append(dup_issue)
+        # The loader upserts on user_id: it must be present and unique
+        issues = policy.run_checks([
+            ('users.user_id not null', df, lambda d: d['user_id'].isnull(), True,
+             "users.user_id: {count} nulls"),
+            ('users.user_id unique', df, lambda d: d.duplicated(subset=['user_id'], keep=False), True,
+             "users: {count} duplicate records found"),
+            ('users.email not null', df, lambda d: d['email'].isnull(), False,
+             "users.email: {count} nulls")
+        ])
+        policy.report()
         
         if issues:
             print(f"   ⚠️  Found {len(issues)} issues")
@@ -86,27 +230,36 @@ class DataValidator:
         return issues
     
     @staticmethod
-    def validate_subscriptions(df):
-        """Validate subscriptions dataframe"""
+    def validate_subscriptions(df, policy=None):
+        """Validate subscriptions dataframe (key checks exhaustive, the rest may be sampled)"""
         print("🔍 Validating subscriptions...")
+        policy = policy or ValidationPolicy()
         
         # Check required columns
         required = ['subscription_id', 'user_id', 'plan_id', 'event_type', 'event_date']
         DataValidator.check_required_columns(df, required, 'subscriptions')
         
-        # Check for nulls
-        issues = DataValidator.check_nulls(df, required, 'subscriptions')
-        
-        # Check duplicates
-        dup_issue = DataValidator.check_duplicates(df, ['subscription_id'], 'subscriptions')
-        if dup_issue:
-            issues.append(dup_issue)
+        # Hard: the loader's dedupe key, columns it turns into user/plan/date keys, and unique ids
+        checks = [
+            (f'subscriptions.{col} not null', df, lambda d, col=col: d[col].isnull(),
+             col in ['subscription_id', 'user_id', 'plan_id', 'event_date'], f"subscriptions.{col}: {{count}} nulls")
+            for col in required
+        ]
+        checks.append(
+            ('subscriptions.subscription_id unique', df,
+             lambda d: d.duplicated(subset=['subscription_id'], keep=False), True,
+             "subscriptions: {count} duplicate records found")
+        )
         
         # Check valid event types
         valid_events = ['signup', 'upgrade', 'downgrade', 'cancel']
-        invalid = df[~df['event_type'].isin(valid_events)]
-        if len(invalid) > 0:
-            issues.append(f"{len(invalid)} invalid event types")
+        checks.append(
+            ('subscriptions.event_type valid', df, lambda d: ~d['event_type'].isin(valid_events), False,
+             "{count} invalid event types")
+        )
+        
+        issues = policy.run_checks(checks)
+        policy.report()
         
         if issues:
             print(f"   ⚠️  Found {len(issues)} issues")
@@ -115,4 +268,4 @@ class DataValidator:
         else:
             print("   ✅ Subscriptions validation passed")
         
-        return issues
\ No newline at end of file
+        return issues
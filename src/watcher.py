@@ -0,0 +1,183 @@
+"""
+Watch module - long-running micro-batch ingestion
+Polls the input directory and runs extract -> transform -> load on new or changed files
+"""
+
+import os
+import time
+from pathlib import Path
+import psycopg2
+from src.extract import DataExtractor, source_kind
+
+
+# Failures worth retrying the whole batch for (the database, not the files)
+TRANSIENT_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+# Users first, so per-file retries still find the users a later file references
+KIND_ORDER = ['users', 'subscriptions', 'events']
+
+
+class MicroBatchDaemon:
+    """Watches a directory and loads new/changed source files in micro-batches"""
+    
+    def __init__(self, watch_dir, transformer, loader=None, poll_seconds=1.0,
+                 debounce_seconds=2.0, max_latency_seconds=30.0):
+        self.watch_dir = Path(watch_dir)
+        self.extractor = DataExtractor(watch_dir)
+        self.transformer = transformer
+        self.loader = loader
+        
+        self.poll_seconds = poll_seconds
+        self.debounce_seconds = debounce_seconds
+        self.max_latency_seconds = max_latency_seconds
+        
+        # path -> (mtime_ns, size) of the version last processed
+        self.processed = {}
+        # path -> {'signature', 'first_seen', 'last_change'} awaiting a batch
+        self.pending = {}
+        
+        # path -> signature of a version that failed on its own (skipped until it changes)
+        self.failed = {}
+        
+        # After a database failure, wait until this time before retrying
+        self.retry_at = None
+    
+    def scan(self, now):
+        """Record new or changed source files as pending"""
+        for entry in os.scandir(self.watch_dir):
+            if not entry.is_file() or source_kind(entry.name) is None:
+                continue
+            
+            stat = entry.stat()
+            signature = (stat.st_mtime_ns, stat.st_size)
+            path = Path(entry.path)
+            
+            if self.processed.get(path) == signature or self.failed.get(path) == signature:
+                self.pending.pop(path, None)
+                continue
+            
+            pending = self.pending.get(path)
+            if pending is None:
+                self.pending[path] = {'signature': signature, 'first_seen': now, 'last_change': now}
+            elif pending['signature'] != signature:
+                # Still being written: restart the debounce window
+                pending['signature'] = signature
+                pending['last_change'] = now
+    
+    def ready_batch(self, now):
+        """Pending files to process now, or [] to keep waiting"""
+        if not self.pending or (self.retry_at is not None and now < self.retry_at):
+            return []
+        
+        quiet_for = now - max(p['last_change'] for p in self.pending.values())
+        waiting_for = now - min(p['first_seen'] for p in self.pending.values())
+        
+        # Files settled, or the oldest change has waited long enough
+        if quiet_for >= self.debounce_seconds or waiting_for >= self.max_latency_seconds:
+            return sorted(self.pending, key=lambda path: (KIND_ORDER.index(source_kind(path)), path))
+        
+        return []
+    
+    def process_batch(self, file_paths):
+        """Run extract -> transform -> load for just these files"""
+        print("\n" + "="*60)
+        print(f"⚡ MICRO-BATCH: {len(file_paths)} file(s)")
+        print("="*60)
+        
+        signatures = {path: self.pending[path]['signature'] for path in file_paths}
+        
+        # The kept-open connection may have died with a database restart
+        if self.loader is not None and (self.loader.conn is None or self.loader.conn.closed):
+            self.loader.connect()
+        
+        try:
+            raw_data = self.extractor.extract_files(file_paths)
+            
+            # Users referenced by this batch but loaded in earlier ones
+            known_user_ids = set()
+            if self.loader is not None:
+                batch_users = set(raw_data['users']['user_id']) if 'users' in raw_data else set()
+                referenced = set()
+                for kind in ['subscriptions', 'events']:
+                    if kind in raw_data:
+                        referenced |= set(raw_data[kind]['user_id'].dropna())
+                known_user_ids = set(self.loader.get_user_keys(sorted(referenced - batch_users)).index)
+            
+            clean_data = self.transformer.transform_all(raw_data, known_user_ids=known_user_ids)
+            
+            if self.loader is not None:
+                self.loader.load_all(clean_data)
+        except Exception:
+            # The kept-open connection must not stay in an aborted transaction,
+            # or every later batch would fail on it too
+            if self.loader is not None and self.loader.conn is not None and not self.loader.conn.closed:
+                self.loader.conn.rollback()
+            raise
+        
+        for path, signature in signatures.items():
+            self.processed[path] = signature
+            self.pending.pop(path, None)
+        
+        return clean_data
+    
+    def run_once(self, now=None):
+        """One poll: scan, and process a batch if one is ready"""
+        now = time.monotonic() if now is None else now
+        
+        self.scan(now)
+        batch = self.ready_batch(now)
+        
+        if batch:
+            try:
+                self.process_batch(batch)
+                self.retry_at = None
+            except TRANSIENT_ERRORS as e:
+                self.defer(e, now)
+            except Exception as e:
+                print(f"❌ Micro-batch failed: {e}")
+                self.isolate_failures(batch, e, now)
+        
+        return batch
+    
+    def defer(self, error, now):
+        """Database trouble: keep files pending, retry after a max-latency window"""
+        print(f"❌ Micro-batch failed, retrying later: {error}")
+        self.retry_at = now + self.max_latency_seconds
+    
+    def quarantine(self, path, error):
+        """Set a failing file aside until it changes, so it can't block the rest"""
+        self.failed[path] = self.pending.pop(path)['signature']
+        print(f"   🚫 Skipping {path.name} until it changes: {error}")
+    
+    def isolate_failures(self, batch, error, now):
+        """Retry a failed batch file by file, quarantining the files that fail"""
+        if len(batch) == 1:
+            self.quarantine(batch[0], error)
+            return
+        
+        for path in batch:
+            try:
+                self.process_batch([path])
+            except TRANSIENT_ERRORS as e:
+                self.defer(e, now)
+                return
+            except Exception as e:
+                self.quarantine(path, e)
+    
+    def run(self):
+        """Poll forever, keeping the loader's connection warm between batches"""
+        print(f"👀 Watching {self.watch_dir} (debounce {self.debounce_seconds}s, "
+              f"max latency {self.max_latency_seconds}s)")
+        
+        if self.loader is not None:
+            self.loader.connect()
+        
+        try:
+            while True:
+                self.run_once()
+                time.sleep(self.poll_seconds)
+        except KeyboardInterrupt:
+            print("\n🛑 Stopping watcher")
+        finally:
+            if self.loader is not None:
+                self.loader.disconnect()
@@ -3,10 +3,17 @@ Test loading data to database
 Run: python test_load.py
 """
 
+import tempfile
+import pandas as pd
+import psycopg2
+import pyarrow.parquet as pq
+from config import config
 from src.extract import DataExtractor
 from src.transform import DataTransformer
 from src.load import DataLoader
 from src.database import DatabaseHelper
+from src.export import MetricExporter, METRIC_QUERIES
+from src.stats import WarehouseStats
 
 
 def test_full_etl():
@@ -43,7 +50,7 @@ def test_full_etl():
     
     # Show final stats
     print("\n📊 Final Warehouse State:")
-    counts = DatabaseHelper.get_table_counts()
+    counts = DatabaseHelper.get_table_counts(mode='exact')
     if counts:
         for table, count in counts.items():
             print(f"   {table}: {count:,} rows")
@@ -51,5 +58,425 @@ def test_full_etl():
     print("\n✅ All tests passed! Your ETL pipeline is working!")
 
 
+def test_metric_export():
+    """Test month-partitioned Parquet snapshots match the warehouse"""
+    print("🧪 Testing metric export...\n")
+    
+    if not DatabaseHelper.test_connection():
+        print("\n❌ Cannot connect to database. Check your .env file!")
+        return
+    
+    conn = psycopg2.connect(config.db_connection_string)
+    
+    try:
+        with tempfile.TemporaryDirectory() as export_dir:
+            # Tiny fetch size so every metric streams in several chunks
+            metrics = MetricExporter(conn, export_dir, fetch_rows=2).export_all(batch_id=0)
+            assert set(metrics) == set(METRIC_QUERIES)
+            
+            table = pq.read_table(f"{export_dir}/signups_by_month", partitioning='hive')
+            assert table.num_rows == metrics['signups_by_month']
+            
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM fact_subscriptions WHERE event_type = 'signup'")
+            assert sum(table.column('new_signups').to_pylist()) == cursor.fetchone()[0]
+            cursor.close()
+    finally:
+        conn.close()
+    
+    print("\n✅ Metric export test passed!")
+
+
+def test_subscription_state():
+    """Test incremental state updates for in-order, late and same-day events"""
+    print("🧪 Testing subscription state replay...\n")
+    
+    if not DatabaseHelper.test_connection():
+        print("\n❌ Cannot connect to database. Check your .env file!")
+        return
+    
+    user_ids = ['TEST_STATE_U1', 'TEST_STATE_U2']
+    prices = {'free': 0.00, 'pro': 29.00, 'enterprise': 99.00}
+    
+    def subscriptions(*events):
+        df = pd.DataFrame(events, columns=['subscription_id', 'user_id', 'plan_id', 'event_type', 'event_date'])
+        df['event_date'] = pd.to_datetime(df['event_date'])
+        df['date_key'] = df['event_date'].dt.strftime('%Y%m%d').astype(int)
+        df['mrr_amount'] = df['plan_id'].map(prices).where(df['event_type'] != 'cancel', 0.0)
+        return df
+    
+    batches = [
+        # In order; U2 has two events on the same day (sub_key breaks the tie)
+        subscriptions(('TEST_STATE_S1', 'TEST_STATE_U1', 'pro', 'signup', '2024-01-10'),
+                      ('TEST_STATE_S2', 'TEST_STATE_U2', 'free', 'signup', '2024-03-01'),
+                      ('TEST_STATE_S3', 'TEST_STATE_U2', 'pro', 'upgrade', '2024-03-01')),
+        # U1 moves forward; a later batch adds another same-day event for U2
+        subscriptions(('TEST_STATE_S4', 'TEST_STATE_U1', 'enterprise', 'upgrade', '2024-02-01'),
+                      ('TEST_STATE_S5', 'TEST_STATE_U2', 'pro', 'cancel', '2024-03-01')),
+        # Late events: older than the current state, must not replace it
+        subscriptions(('TEST_STATE_S6', 'TEST_STATE_U1', 'free', 'downgrade', '2024-01-20'),
+                      ('TEST_STATE_S7', 'TEST_STATE_U2', 'enterprise', 'upgrade', '2024-02-15'))
+    ]
+    
+    loader = DataLoader()
+    loader.connect()
+    
+    try:
+        loader.start_batch()
+        loader.load_users(pd.DataFrame({
+            'user_id': user_ids,
+            'email': [f"{user_id.lower()}@example.com" for user_id in user_ids],
+            'signup_date': pd.to_datetime(['2024-01-10', '2024-03-01']),
+            'company_size': ['1-10', '1-10'],
+            'industry': ['Test', 'Test']
+        }))
+        
+        for i, batch in enumerate(batches):
+            if i > 0:
+                loader.start_batch()
+            loader.load_subscriptions(batch, bulk=False)
+            assert loader.verify_data_quality(full_audit=False)
+            loader.finish_batch('loaded')
+        
+        loader.cursor.execute("""
+            SELECT u.user_id, s.last_event_type, s.current_mrr, s.last_date_key, s.event_count
+            FROM subscription_state s
+            JOIN dim_users u ON u.user_key = s.user_key
+            WHERE u.user_id = ANY(%s)
+            ORDER BY u.user_id
+        """, (user_ids,))
+        state = [(user_id, event_type, float(mrr), date_key, count)
+                 for user_id, event_type, mrr, date_key, count in loader.cursor.fetchall()]
+        
+        assert state == [
+            ('TEST_STATE_U1', 'upgrade', 99.00, 20240201, 3),
+            ('TEST_STATE_U2', 'cancel', 0.00, 20240301, 4)
+        ], state
+        
+        # Re-sent events are skipped, and verification accounts for them
+        loader.start_batch()
+        loader.load_subscriptions(pd.concat([batches[0], subscriptions(
+            ('TEST_STATE_S8', 'TEST_STATE_U1', 'pro', 'downgrade', '2024-04-01'))]), bulk=False)
+        assert loader.batch_expected['skipped_ids'] == ['TEST_STATE_S1', 'TEST_STATE_S2', 'TEST_STATE_S3']
+        assert loader.verify_data_quality(full_audit=False)
+        
+        # A stored amount that differs from what was sent is caught
+        loader.cursor.execute("UPDATE fact_subscriptions SET mrr_amount = 1 WHERE subscription_id = 'TEST_STATE_S8'")
+        assert not loader.verify_data_quality(full_audit=False)
+        loader.finish_batch('loaded_with_issues')
+    finally:
+        # Remove the test rows and their share of the running counts
+        loader.conn.rollback()
+        loader.cursor.execute("SELECT user_key FROM dim_users WHERE user_id = ANY(%s)", (user_ids,))
+        user_keys = [key for (key,) in loader.cursor.fetchall()]
+        
+        loader.cursor.execute("DELETE FROM subscription_state WHERE user_key = ANY(%s)", (user_keys,))
+        loader.cursor.execute("DELETE FROM fact_subscriptions WHERE user_key = ANY(%s)", (user_keys,))
+        WarehouseStats(loader.cursor).increment('fact_subscriptions', -loader.cursor.rowcount)
+        loader.cursor.execute("DELETE FROM dim_users WHERE user_key = ANY(%s)", (user_keys,))
+        WarehouseStats(loader.cursor).increment('dim_users', -loader.cursor.rowcount)
+        loader.conn.commit()
+        loader.disconnect()
+    
+    print("\n✅ Subscription state tests passed!")
+
+
+def test_overlapping_usage_windows():
+    """Test that a re-sent, partly overlapping window keeps earlier events"""
+    print("🧪 Testing overlapping usage windows...\n")
+    
+    if not DatabaseHelper.test_connection():
+        print("\n❌ Cannot connect to database. Check your .env file!")
+        return
+    
+    user_id = 'TEST_USAGE_U1'
+    feature = 'test_overlap_feature'
+    
+    def usage_events(*events):
+        df = pd.DataFrame(events, columns=['event_id', 'timestamp'])
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        return df.assign(user_id=user_id, event_type='feature_use', feature_name=feature)
+    
+    # Run 1 covers 00:00-12:00 of the day, run 2 re-sends 06:00-18:00
+    windows = [
+        usage_events(('TEST_USAGE_E1', '2024-06-03 01:00'),
+                     ('TEST_USAGE_E2', '2024-06-03 05:00'),
+                     ('TEST_USAGE_E3', '2024-06-03 11:00')),
+        usage_events(('TEST_USAGE_E3', '2024-06-03 11:00'),
+                     ('TEST_USAGE_E4', '2024-06-03 11:20'),
+                     ('TEST_USAGE_E5', '2024-06-03 17:00'))
+    ]
+    
+    loader = DataLoader()
+    loader.connect()
+    
+    try:
+        loader.start_batch()
+        loader.load_users(pd.DataFrame({
+            'user_id': [user_id],
+            'email': ['test_usage_u1@example.com'],
+            'signup_date': pd.to_datetime(['2024-06-01']),
+            'company_size': ['1-10'],
+            'industry': ['Test']
+        }))
+        
+        for i, window in enumerate(windows):
+            if i > 0:
+                loader.start_batch()
+            loader.load_usage_events(window)
+            loader.finish_batch('loaded')
+        
+        loader.cursor.execute("""
+            SELECT a.events, a.sessions, a.session_seconds, a.features_used
+            FROM agg_daily_user_usage a
+            JOIN dim_users u ON u.user_key = a.user_key
+            WHERE u.user_id = %s AND a.date_key = 20240603
+        """, (user_id,))
+        # 01:00, 05:00, 11:00-11:20 and 17:00 sessions
+        assert loader.cursor.fetchone() == (5, 4, 1200, 1)
+        
+        loader.cursor.execute("""
+            SELECT events, users FROM agg_daily_feature_usage
+            WHERE feature_name = %s AND date_key = 20240603
+        """, (feature,))
+        assert loader.cursor.fetchone() == (5, 1)
+    finally:
+        # Remove the test rows and their share of the running counts
+        loader.conn.rollback()
+        loader.cursor.execute("SELECT user_key FROM dim_users WHERE user_id = %s", (user_id,))
+        user_keys = [key for (key,) in loader.cursor.fetchall()]
+        
+        loader.cursor.execute("DELETE FROM agg_daily_feature_usage WHERE feature_name = %s", (feature,))
+        loader.cursor.execute("DELETE FROM agg_daily_user_usage WHERE user_key = ANY(%s)", (user_keys,))
+        loader.cursor.execute("DELETE FROM etl_seen_events WHERE user_key = ANY(%s)", (user_keys,))
+        loader.cursor.execute("DELETE FROM dim_users WHERE user_key = ANY(%s)", (user_keys,))
+        WarehouseStats(loader.cursor).increment('dim_users', -loader.cursor.rowcount)
+        loader.conn.commit()
+        loader.disconnect()
+    
+    print("\n✅ Overlapping usage window tests passed!")
+
+
+def test_fact_index_maintenance():
+    """Test bulk-mode index drops/rebuilds and repair of invalid fact indexes"""
+    print("🧪 Testing fact index maintenance...\n")
+    
+    if not DatabaseHelper.test_connection():
+        print("\n❌ Cannot connect to database. Check your .env file!")
+        return
+    
+    user_id = 'TEST_INDEX_U1'
+    index_names = ['idx_fact_user', 'idx_fact_date', 'idx_fact_event', 'idx_fact_batch', 'idx_fact_subscription_id']
+    expected = {name: (True, name == 'idx_fact_subscription_id') for name in index_names}
+    bulk_min_rows, bulk_ratio = config.BULK_LOAD_MIN_ROWS, config.BULK_LOAD_RATIO
+    
+    def subscriptions(*events):
+        df = pd.DataFrame(events, columns=['subscription_id', 'event_type'])
+        return df.assign(user_id=user_id, plan_id='pro', event_date=pd.Timestamp('2024-05-01'),
+                         date_key=20240501, mrr_amount=29.00)
+    
+    def fact_indexes():
+        # {name: (valid, unique)} as the catalog sees it
+        loader.cursor.execute("""
+            SELECT c.relname, i.indisvalid, i.indisunique
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE i.indrelid = 'fact_subscriptions'::regclass
+                AND c.relname = ANY(%s)
+        """, (index_names,))
+        return {name: (is_valid, is_unique) for name, is_valid, is_unique in loader.cursor.fetchall()}
+    
+    loader = DataLoader()
+    loader.connect()
+    
+    # Count how often a load actually took the bulk path
+    drops = []
+    drop_fact_indexes = loader.drop_fact_indexes
+    
+    def counting_drop_fact_indexes():
+        drops.append(loader.batch_id)
+        drop_fact_indexes()
+    
+    loader.drop_fact_indexes = counting_drop_fact_indexes
+    
+    try:
+        loader.start_batch()
+        loader.load_users(pd.DataFrame({
+            'user_id': [user_id],
+            'email': ['test_index_u1@example.com'],
+            'signup_date': pd.to_datetime(['2024-05-01']),
+            'company_size': ['1-10'],
+            'industry': ['Test']
+        }))
+        
+        # Automatic mode follows the size thresholds
+        config.BULK_LOAD_MIN_ROWS = 10 ** 9
+        assert not loader.choose_load_mode(2)[0]
+        config.BULK_LOAD_MIN_ROWS, config.BULK_LOAD_RATIO = 1, 0.0
+        assert loader.choose_load_mode(2)[0]
+        
+        loader.load_subscriptions(subscriptions(('TEST_INDEX_S1', 'signup'), ('TEST_INDEX_S2', 'signup')))
+        assert len(drops) == 1
+        assert fact_indexes() == expected
+        assert not loader.conn.autocommit
+        
+        # An explicit bulk flag overrides the thresholds either way
+        loader.load_subscriptions(subscriptions(('TEST_INDEX_S3', 'upgrade')), bulk=False)
+        assert len(drops) == 1
+        config.BULK_LOAD_MIN_ROWS = 10 ** 9
+        loader.load_subscriptions(subscriptions(('TEST_INDEX_S4', 'upgrade')), bulk=True)
+        assert len(drops) == 2
+        assert fact_indexes() == expected
+        assert not loader.conn.autocommit
+        
+        # A failed bulk insert still gets its indexes back
+        try:
+            loader.load_subscriptions(subscriptions(('TEST_INDEX_S5', 'x' * 30)), bulk=True)
+        except psycopg2.DataError:
+            pass
+        else:
+            raise AssertionError("over-long event_type should fail the insert")
+        assert len(drops) == 3
+        assert fact_indexes() == expected
+        assert not loader.conn.autocommit
+        
+        # A failed CREATE INDEX CONCURRENTLY leaves an INVALID index behind
+        loader.conn.commit()
+        loader.conn.autocommit = True
+        loader.cursor.execute("DROP INDEX idx_fact_event")
+        try:
+            loader.cursor.execute("CREATE UNIQUE INDEX CONCURRENTLY idx_fact_event ON fact_subscriptions(event_type)")
+        except psycopg2.IntegrityError:
+            pass
+        loader.conn.autocommit = False
+        assert fact_indexes()['idx_fact_event'] == (False, True)
+        
+        loader.ensure_fact_indexes()
+        assert fact_indexes() == expected
+        
+        # A non-unique subscription_id index (older schema) is replaced
+        loader.cursor.execute("DROP INDEX idx_fact_subscription_id")
+        loader.cursor.execute("CREATE INDEX idx_fact_subscription_id ON fact_subscriptions(subscription_id)")
+        loader.conn.commit()
+        assert fact_indexes()['idx_fact_subscription_id'] == (True, False)
+        
+        loader.ensure_fact_indexes()
+        assert fact_indexes() == expected
+        
+        # Autocommit is switched back off even when the concurrent build fails
+        loader.cursor.execute("DROP INDEX idx_fact_subscription_id")
+        loader.cursor.execute("""
+            INSERT INTO fact_subscriptions
+                (subscription_id, user_key, plan_key, date_key, event_type, mrr_amount, batch_id)
+            SELECT subscription_id, user_key, plan_key, date_key, event_type, mrr_amount, batch_id
+            FROM fact_subscriptions
+            WHERE subscription_id = 'TEST_INDEX_S1'
+        """)
+        loader.conn.commit()
+        try:
+            loader.ensure_fact_indexes()
+        except psycopg2.IntegrityError:
+            pass
+        else:
+            raise AssertionError("duplicate subscription_id should fail the unique build")
+        assert not loader.conn.autocommit
+        assert fact_indexes()['idx_fact_subscription_id'] == (False, True)
+        
+        loader.cursor.execute("""
+            DELETE FROM fact_subscriptions
+            WHERE sub_key = (SELECT MAX(sub_key) FROM fact_subscriptions WHERE subscription_id = 'TEST_INDEX_S1')
+        """)
+        loader.conn.commit()
+        loader.ensure_fact_indexes()
+        assert fact_indexes() == expected
+        loader.finish_batch('loaded')
+    finally:
+        # Remove the test rows and their share of the running counts
+        config.BULK_LOAD_MIN_ROWS, config.BULK_LOAD_RATIO = bulk_min_rows, bulk_ratio
+        loader.conn.rollback()
+        loader.conn.autocommit = False
+        loader.cursor.execute("SELECT user_key FROM dim_users WHERE user_id = %s", (user_id,))
+        user_keys = [key for (key,) in loader.cursor.fetchall()]
+        
+        loader.cursor.execute("DELETE FROM subscription_state WHERE user_key = ANY(%s)", (user_keys,))
+        loader.cursor.execute("DELETE FROM fact_subscriptions WHERE user_key = ANY(%s)", (user_keys,))
+        WarehouseStats(loader.cursor).increment('fact_subscriptions', -loader.cursor.rowcount)
+        loader.cursor.execute("DELETE FROM dim_users WHERE user_key = ANY(%s)", (user_keys,))
+        WarehouseStats(loader.cursor).increment('dim_users', -loader.cursor.rowcount)
+        loader.conn.commit()
+        
+        # Leave the indexes as the schema defines them
+        loader.ensure_fact_indexes()
+        loader.disconnect()
+    
+    print("\n✅ Fact index maintenance tests passed!")
+
+
+def test_user_key_lookup_paths():
+    """Test the COPY + join key lookup returns what the ANY(%s) lookup does"""
+    print("🧪 Testing user key lookup paths...\n")
+    
+    if not DatabaseHelper.test_connection():
+        print("\n❌ Cannot connect to database. Check your .env file!")
+        return
+    
+    user_ids = ['TEST_LOOKUP_U1', 'TEST_LOOKUP_U2', 'TEST_LOOKUP_U3']
+    lookups = [
+        user_ids,
+        # Unknown and repeated ids mixed in
+        ['TEST_LOOKUP_U2', 'TEST_LOOKUP_UNKNOWN1', 'TEST_LOOKUP_U2', None, 'TEST_LOOKUP_U3'],
+        # Nothing matches
+        ['TEST_LOOKUP_UNKNOWN1', 'TEST_LOOKUP_UNKNOWN2']
+    ]
+    temp_table_min = config.KEY_LOOKUP_TEMP_TABLE_MIN
+    
+    loader = DataLoader()
+    loader.connect()
+    
+    try:
+        loader.start_batch()
+        loader.load_users(pd.DataFrame({
+            'user_id': user_ids,
+            'email': [f"{user_id.lower()}@example.com" for user_id in user_ids],
+            'signup_date': pd.to_datetime(['2024-07-01'] * 3),
+            'company_size': ['1-10'] * 3,
+            'industry': ['Test'] * 3
+        }))
+        loader.finish_batch('loaded')
+        
+        for lookup in lookups:
+            config.KEY_LOOKUP_TEMP_TABLE_MIN = 10 ** 9
+            via_any = loader.get_user_keys(lookup)
+            config.KEY_LOOKUP_TEMP_TABLE_MIN = 1
+            via_temp_table = loader.get_user_keys(lookup)
+            
+            assert via_any.dtype == via_temp_table.dtype == 'int64'
+            assert sorted(via_temp_table.items()) == sorted(via_any.items()), (lookup, via_temp_table)
+            assert set(via_temp_table.index) == set(lookup) & set(user_ids)
+            
+            # Usable as a .map lookup, like load_subscriptions does
+            mapped = pd.Series(lookup, dtype=object).map(via_temp_table)
+            assert mapped.notna().sum() == sum(user_id in user_ids for user_id in lookup)
+        
+        # The temp table is dropped again, so the lookup can repeat in one transaction
+        loader.get_user_keys(user_ids)
+        loader.get_user_keys(user_ids)
+    finally:
+        # Remove the test rows and their share of the running counts
+        config.KEY_LOOKUP_TEMP_TABLE_MIN = temp_table_min
+        loader.conn.rollback()
+        loader.cursor.execute("DELETE FROM dim_users WHERE user_id = ANY(%s)", (user_ids,))
+        WarehouseStats(loader.cursor).increment('dim_users', -loader.cursor.rowcount)
+        loader.conn.commit()
+        loader.disconnect()
+    
+    print("\n✅ User key lookup tests passed!")
+
+
 if __name__ == '__main__':
-    test_full_etl()
\ No newline at end of file
+    test_full_etl()
+    test_metric_export()
+    test_subscription_state()
+    test_overlapping_usage_windows()
+    test_fact_index_maintenance()
+    test_user_key_lookup_paths()
\ No newline at end of file
@@ -3,8 +3,23 @@ Test transformation logic
 Run: python test_transform.py
 """
 
+import tempfile
+import numpy as np
+import pandas as pd
 from src.extract import DataExtractor
 from src.transform import DataTransformer
+from src.pricing import PlanPriceIndex
+from src.sessions import EventSessionizer
+from src.dedupe import BloomFilter, SeenIds
+from src.validator import ValidationPolicy
+
+
+# Fixture prices (same as the schema.sql seed), so tests run without dim_plans
+TEST_PLAN_PRICES = {
+    'free': 0.00,
+    'pro': 29.00,
+    'enterprise': 99.00
+}
 
 
 def test_transformation():
@@ -16,7 +31,7 @@ def test_transformation():
     raw_data = extractor.extract_all()
     
     # Transform
-    transformer = DataTransformer()
+    transformer = DataTransformer(price_index=PlanPriceIndex.from_dict(TEST_PLAN_PRICES))
     clean_data = transformer.transform_all(raw_data)
     
     # Verify results
@@ -55,5 +70,212 @@ def test_transformation():
     print(event_dist)
 
 
+def test_versioned_pricing():
+    """Test that events are priced with the version in effect on their date"""
+    print("🧪 Testing versioned plan pricing...\n")
+    
+    price_index = PlanPriceIndex(pd.DataFrame({
+        'plan_key': [1, 2, 3, 4],
+        'plan_id': ['free', 'pro', 'pro', 'enterprise'],
+        'effective_from': ['1970-01-01', '1970-01-01', '2024-03-01', '1970-01-01'],
+        'monthly_price': [0.00, 29.00, 35.00, 99.00]
+    }))
+    
+    subs = pd.DataFrame({
+        'subscription_id': ['S1', 'S2', 'S3', 'S4'],
+        'user_id': ['U1', 'U1', 'U2', 'U2'],
+        'plan_id': ['pro', 'pro', 'enterprise', 'pro'],
+        'event_type': ['signup', 'upgrade', 'signup', 'cancel'],
+        'event_date': pd.to_datetime(['2024-02-29', '2024-03-01', '2024-01-01', '2024-04-01'])
+    })
+    
+    transformer = DataTransformer(price_index=price_index)
+    priced = transformer.calculate_mrr(subs)
+    
+    assert priced['mrr_amount'].tolist() == [29.00, 35.00, 99.00, 0.00]
+    assert priced['plan_key'].tolist() == [2, 3, 4, 3]
+    
+    # Enterprise only priced from 2024-03-01: earlier events are skipped,
+    # earlier cancels keep the first version's plan_key
+    price_index = PlanPriceIndex(pd.DataFrame({
+        'plan_key': [1, 2, 5],
+        'plan_id': ['free', 'pro', 'enterprise'],
+        'effective_from': ['1970-01-01', '1970-01-01', '2024-03-01'],
+        'monthly_price': [0.00, 29.00, 99.00]
+    }))
+    
+    subs = pd.DataFrame({
+        'subscription_id': ['S1', 'S2', 'S3', 'S4'],
+        'user_id': ['U1', 'U1', 'U2', 'U2'],
+        'plan_id': ['pro', 'enterprise', 'enterprise', 'enterprise'],
+        'event_type': ['signup', 'upgrade', 'signup', 'cancel'],
+        'event_date': pd.to_datetime(['2024-01-01', '2024-03-01', '2024-01-01', '2024-02-01'])
+    })
+    
+    transformer = DataTransformer(price_index=price_index)
+    priced = transformer.calculate_mrr(subs)
+    
+    assert priced['subscription_id'].tolist() == ['S1', 'S2', 'S4']
+    assert priced['mrr_amount'].tolist() == [29.00, 99.00, 0.00]
+    assert priced['plan_key'].tolist() == [2, 5, 5]
+    
+    print("\n✅ Versioned pricing tests passed!")
+
+
+def test_sessionization():
+    """Test session assignment and daily usage rollups"""
+    print("🧪 Testing event sessionization...\n")
+    
+    # Deliberately unsorted; U1 has a 2h gap, U2 crosses midnight
+    events = pd.DataFrame({
+        'event_id': ['E1', 'E2', 'E3', 'E4', 'E5', 'E6'],
+        'user_id': ['U1', 'U2', 'U1', 'U1', 'U2', 'U1'],
+        'event_type': ['feature_usage', 'login', 'feature_usage', 'login', 'feature_usage', 'feature_usage'],
+        'feature_name': ['project_created', None, 'task_created', None, 'task_created', 'project_created'],
+        'timestamp': ['2024-02-05 10:00:00', '2024-02-05 23:50:00', '2024-02-05 10:20:00',
+                      '2024-02-05 12:30:00', '2024-02-06 00:10:00', '2024-02-05 12:40:00']
+    })
+    
+    sessionizer = EventSessionizer(gap_minutes=30)
+    sessions = sessionizer.sessionize(events)
+    
+    assert sessions['event_id'].tolist() == ['E1', 'E3', 'E4', 'E6', 'E2', 'E5']
+    assert sessions['session_id'].tolist() == [1, 1, 2, 2, 3, 3]
+    
+    daily_users = sessionizer.daily_user_rollup(sessions).set_index(['user_id', 'date_key'])
+    assert daily_users.loc[('U1', 20240205), 'events'] == 4
+    assert daily_users.loc[('U1', 20240205), 'sessions'] == 2
+    assert daily_users.loc[('U1', 20240205), 'session_seconds'] == 20 * 60 + 10 * 60
+    assert daily_users.loc[('U1', 20240205), 'features_used'] == 2
+    assert daily_users.loc[('U2', 20240206), 'sessions'] == 0
+    
+    daily_features = sessionizer.daily_feature_rollup(sessions).set_index(['date_key', 'feature_name'])
+    assert daily_features.loc[(20240205, 'project_created'), 'events'] == 2
+    assert daily_features.loc[(20240205, 'project_created'), 'users'] == 1
+    assert daily_features.loc[(20240206, 'task_created'), 'users'] == 1
+    
+    print("\n✅ Sessionization tests passed!")
+
+
+def test_sharded_transform():
+    """Test that the user-sharded transform matches the serial one"""
+    print("🧪 Testing sharded transformation...\n")
+    
+    extractor = DataExtractor()
+    raw_data = extractor.extract_all()
+    
+    transformer = DataTransformer(price_index=PlanPriceIndex.from_dict(TEST_PLAN_PRICES))
+    users_serial, subs_serial = transformer.transform_user_data(raw_data['users'], raw_data['subscriptions'])
+    users_sharded, subs_sharded = transformer.transform_sharded(raw_data['users'], raw_data['subscriptions'], workers=3)
+    
+    pd.testing.assert_frame_equal(users_sharded, users_serial)
+    pd.testing.assert_frame_equal(subs_sharded, subs_serial)
+    
+    # Versions with plan_keys, and enterprise events before its first version
+    transformer = DataTransformer(price_index=PlanPriceIndex(pd.DataFrame({
+        'plan_key': [1, 2, 3],
+        'plan_id': ['free', 'pro', 'enterprise'],
+        'effective_from': ['1970-01-01', '1970-01-01', '2024-05-01'],
+        'monthly_price': [0.00, 29.00, 99.00]
+    })))
+    _, subs_serial = transformer.transform_user_data(raw_data['users'], raw_data['subscriptions'])
+    _, subs_sharded = transformer.transform_sharded(raw_data['users'], raw_data['subscriptions'], workers=3)
+    
+    pd.testing.assert_frame_equal(subs_sharded, subs_serial)
+    assert subs_serial['mrr_amount'].notna().all()
+    
+    print("\n✅ Sharded transformation tests passed!")
+
+
+def test_cross_run_dedupe():
+    """Test that ids loaded by an earlier run are dropped in the next one"""
+    print("🧪 Testing cross-run dedupe...\n")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Bloom filter: no false negatives, few false positives, persisted
+        bloom = BloomFilter(f"{tmp_dir}/test.bloom", capacity=10_000, fp_rate=0.01)
+        added = np.array([f"ID{i}" for i in range(10_000)], dtype=object)
+        bloom.add(added)
+        bloom.flush()
+        
+        reopened = BloomFilter(f"{tmp_dir}/test.bloom", capacity=10_000, fp_rate=0.01)
+        assert reopened.might_contain(added).all()
+        others = np.array([f"OTHER{i}" for i in range(10_000)], dtype=object)
+        assert reopened.might_contain(others).mean() < 0.03
+        
+        # Stand-in warehouse: ids are "stored" once a run has handed them to the loader
+        warehouse = {'subscriptions': set(), 'events': set()}
+        seen_ids = SeenIds(
+            path=f"{tmp_dir}/seen",
+            capacity=1000,
+            verify=lambda kind, ids: warehouse[kind] & set(ids),
+            seed=lambda kind: []
+        )
+        transformer = DataTransformer(price_index=PlanPriceIndex.from_dict(TEST_PLAN_PRICES), seen_ids=seen_ids)
+        
+        extractor = DataExtractor()
+        raw_data = extractor.extract_all()
+        
+        first = transformer.transform_all(raw_data)
+        warehouse['subscriptions'] |= set(first['subscriptions']['subscription_id'])
+        warehouse['events'] |= set(first['usage_events']['event_id'])
+        assert len(first['subscriptions']) > 0
+        assert len(first['usage_events']) == raw_data['events']['event_id'].nunique()
+        
+        # Re-sent window: everything again plus one new subscription and one new event
+        resent = dict(raw_data)
+        new_sub = raw_data['subscriptions'].iloc[[0]].assign(subscription_id='SUB_NEW')
+        new_event = raw_data['events'].iloc[[0]].assign(event_id='E_NEW')
+        no_id_sub = raw_data['subscriptions'].iloc[[1]].assign(subscription_id=None)
+        resent['subscriptions'] = pd.concat([raw_data['subscriptions'], new_sub, no_id_sub], ignore_index=True)
+        resent['events'] = pd.concat([raw_data['events'], raw_data['events'], new_event], ignore_index=True)
+        
+        # Only new rows go to the loader (it rebuilds the touched days' rollups)
+        second = transformer.transform_all(resent)
+        assert second['subscriptions']['subscription_id'].tolist() == ['SUB_NEW']
+        assert second['usage_events']['event_id'].tolist() == ['E_NEW']
+    
+    print("\n✅ Cross-run dedupe tests passed!")
+
+
+def test_sampled_validation():
+    """Test hard checks stay exhaustive while soft checks are sampled"""
+    print("🧪 Testing sampled validation...\n")
+    
+    rows = 2_000_000
+    users = pd.DataFrame({'user_id': [f"U{i}" for i in range(999)] + [None]})
+    subs = pd.DataFrame({
+        'subscription_id': 'S',
+        'user_id': np.where(np.arange(rows) % 100 == 0, 'U_UNKNOWN', 'U1'),
+        'event_date': pd.Timestamp('2024-01-01')
+    })
+    
+    policy = ValidationPolicy(time_budget_seconds=0.001, sample_above_rows=100_000,
+                              confidence=0.95, min_sample_rows=20_000)
+    transformer = DataTransformer(price_index=PlanPriceIndex.from_dict(TEST_PLAN_PRICES), validation_policy=policy)
+    issues = transformer.validate_data(users, subs)
+    
+    results = {result['check']: result for result in policy.results}
+    
+    # Hard check: every row, exact count
+    assert not results['users.user_id not null']['sampled']
+    assert results['users.user_id not null']['violations'] == 1
+    assert "NULL user_ids found in users (1)" in issues
+    assert not results['subscriptions.subscription_id not null']['sampled']
+    
+    # Soft checks: sampled, and the bounds cover the true 1% orphan rate
+    orphans = results['subscriptions.user_id known']
+    assert orphans['sampled'] and orphans['checked'] == 20_000
+    assert orphans['low'] <= 0.01 <= orphans['high']
+    assert any('sample' in issue for issue in issues)
+    
+    print("\n✅ Sampled validation tests passed!")
+
+
 if __name__ == '__main__':
-    test_transformation()
\ No newline at end of file
+    test_transformation()
+    test_versioned_pricing()
+    test_sessionization()
+    test_sharded_transform()
+    test_cross_run_dedupe()
+    test_sampled_validation()
\ No newline at end of file
@@ -0,0 +1,138 @@
+"""
+Test micro-batch watch mode against a temp directory
+Run: python test_watcher.py
+"""
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from src.database import DatabaseHelper
+from src.load import DataLoader
+from src.pricing import PlanPriceIndex
+from src.transform import DataTransformer
+from src.watcher import MicroBatchDaemon
+from test_transform import TEST_PLAN_PRICES
+
+
+def test_micro_batches():
+    """Test debouncing, max latency and per-file processing"""
+    print("🧪 Testing watch mode micro-batches...\n")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        watch_dir = Path(tmp_dir)
+        daemon = MicroBatchDaemon(
+            watch_dir,
+            transformer=DataTransformer(price_index=PlanPriceIndex.from_dict(TEST_PLAN_PRICES)),
+            debounce_seconds=2.0,
+            max_latency_seconds=5.0
+        )
+        
+        # Nothing to do in an empty directory
+        assert daemon.run_once(now=0.0) == []
+        
+        # New file waits for the debounce window
+        shutil.copy('data/sample/users.csv', watch_dir / 'users.csv')
+        (watch_dir / 'notes.txt').write_text("not a source file")
+        assert daemon.run_once(now=1.0) == []
+        assert daemon.run_once(now=3.5) == [watch_dir / 'users.csv']
+        
+        # Already processed: no new batch
+        assert daemon.run_once(now=10.0) == []
+        
+        # A file that keeps changing is flushed once max latency is reached
+        subs_path = watch_dir / 'subscriptions.json'
+        shutil.copy('data/sample/subscriptions.json', subs_path)
+        for tick in [11.0, 12.5, 14.0, 15.5]:
+            os.utime(subs_path, ns=(int(tick * 1e9), int(tick * 1e9)))
+            assert daemon.run_once(now=tick) == []
+        
+        os.utime(subs_path, ns=(int(16.5e9), int(16.5e9)))
+        assert daemon.run_once(now=16.5) == [subs_path]
+        assert daemon.pending == {}
+    
+    print("\n✅ Watch mode tests passed!")
+
+
+def test_failed_file_isolation():
+    """Test that one bad file is set aside instead of blocking the batch"""
+    print("🧪 Testing watch mode failure isolation...\n")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        watch_dir = Path(tmp_dir)
+        daemon = MicroBatchDaemon(
+            watch_dir,
+            transformer=DataTransformer(price_index=PlanPriceIndex.from_dict(TEST_PLAN_PRICES)),
+            debounce_seconds=1.0,
+            max_latency_seconds=5.0
+        )
+        
+        # An empty events file can't be read; users.csv is fine
+        shutil.copy('data/sample/users.csv', watch_dir / 'users.csv')
+        events_path = watch_dir / 'events.ndjson'
+        events_path.write_text("")
+        
+        assert daemon.run_once(now=0.0) == []
+        assert daemon.run_once(now=1.0) == [watch_dir / 'users.csv', events_path]
+        assert watch_dir / 'users.csv' in daemon.processed
+        assert events_path in daemon.failed
+        assert daemon.pending == {}
+        
+        # Quarantined until it changes, then picked up again
+        assert daemon.run_once(now=10.0) == []
+        events_path.write_text('{"event_id": "E1", "user_id": "U001", "event_type": "login", '
+                               '"feature_name": "dashboard", "timestamp": "2024-01-15T10:00:00"}\n')
+        assert daemon.run_once(now=11.0) == []
+        assert daemon.run_once(now=12.0) == [events_path]
+        assert daemon.processed[events_path] != daemon.failed[events_path]
+    
+    print("\n✅ Failure isolation tests passed!")
+
+
+def test_failed_file_keeps_connection_usable():
+    """Test that a database error in one file doesn't poison the kept-open connection"""
+    print("🧪 Testing watch mode recovery after a database error...\n")
+    
+    if not DatabaseHelper.test_connection():
+        print("\n❌ Cannot connect to database. Check your .env file!")
+        return
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        watch_dir = Path(tmp_dir)
+        loader = DataLoader()
+        daemon = MicroBatchDaemon(
+            watch_dir,
+            transformer=DataTransformer(price_index=PlanPriceIndex.from_dict(TEST_PLAN_PRICES)),
+            loader=loader,
+            debounce_seconds=1.0,
+            max_latency_seconds=5.0
+        )
+        loader.connect()
+        
+        try:
+            # Numeric user_id: the known-user lookup fails in the database
+            bad_path = watch_dir / 'subscriptions_bad.ndjson'
+            bad_path.write_text('{"subscription_id": "TEST_WATCH_S1", "user_id": 1, "plan_id": "pro", '
+                                '"event_type": "signup", "event_date": "2024-01-15"}\n')
+            assert daemon.run_once(now=0.0) == []
+            assert daemon.run_once(now=1.0) == [bad_path]
+            assert bad_path in daemon.failed
+            
+            # A valid file afterwards still loads on the same connection
+            good_path = watch_dir / 'subscriptions_good.json'
+            good_path.write_text('[{"subscription_id": "TEST_WATCH_S2", "user_id": "TEST_WATCH_U1", '
+                                 '"plan_id": "pro", "event_type": "signup", "event_date": "2024-01-15"}]')
+            assert daemon.run_once(now=2.0) == []
+            assert daemon.run_once(now=3.0) == [good_path]
+            assert good_path in daemon.processed
+            assert good_path not in daemon.failed
+        finally:
+            loader.disconnect()
+    
+    print("\n✅ Database error recovery tests passed!")
+
+
+if __name__ == '__main__':
+    test_micro_batches()
+    test_failed_file_isolation()
+    test_failed_file_keeps_connection_usable()